@@ -7,8 +7,8 @@ Core Objects: Model, and Agent.
 """
 import datetime
 
-from mesa.model import Model
-from mesa.agent import Agent
+from .model import Model
+from .agent import Agent
 
 
 __all__ = ["Model", "Agent"]
@@ -1,17 +1,24 @@
 """
 The agent class for Mesa framework.
 
-Core Objects: Agent
+Core Objects: Agent, ColumnAgent, AgentSet
 
 """
 # mypy
-from mesa.model import Model
+from .model import Model
 from random import Random
 
+import numpy as np
+
+from typing import Any, Dict, Iterator, List, Optional
+
 
 class Agent:
     """ Base class for a model agent. """
 
+    # Subclasses without __slots__ still get a __dict__ for their attributes
+    __slots__ = ("unique_id", "model", "pos", "__weakref__")
+
     def __init__(self, unique_id: int, model: Model) -> None:
         """ Create a new agent. """
         self.unique_id = unique_id
@@ -28,3 +35,211 @@ class Agent:
     @property
     def random(self) -> Random:
         return self.model.random
+
+
+class Column:
+    """An agent attribute stored in a NumPy column of an AgentSet, declared
+    on a ColumnAgent subclass:
+
+        class SPDAgent(ColumnAgent):
+            energy = Column(np.float64)
+            cooperator = Column(bool, default=False)
+            memory = Column(object, default=None)
+
+    """
+
+    def __init__(self, dtype: Any = np.float64, default: Any = 0) -> None:
+        self.dtype = np.dtype(dtype)
+        self.default = default
+        self.name = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, agent: Any, owner: Optional[type] = None) -> Any:
+        if agent is None:
+            return self
+        try:
+            return agent.agent_set.columns[self.name].item(agent._row)
+        except AttributeError:
+            raise Exception("Agent {} has no AgentSet".format(repr(agent.unique_id)))
+
+    def __set__(self, agent: Any, value: Any) -> None:
+        try:
+            agent.agent_set.columns[self.name][agent._row] = value
+        except AttributeError:
+            raise Exception("Agent {} has no AgentSet".format(repr(agent.unique_id)))
+
+
+class ColumnAgent(Agent):
+    """An agent whose Column attributes live in the NumPy columns of an
+    AgentSet, so that they can be read and updated for all agents at once.
+
+    The agent itself only holds its unique_id, model, pos and row, in
+    __slots__; subclasses should declare __slots__ too for any other
+    attribute, or they get a __dict__ back.
+
+    """
+
+    __slots__ = ("agent_set", "_row")
+
+    def __init__(
+        self, unique_id: int, model: Model, agent_set: "AgentSet", **values: Any
+    ) -> None:
+        """Create a new agent in a row of agent_set.
+
+        Args:
+            unique_id, model: As for Agent.
+            agent_set: The AgentSet holding the columns.
+            values: Initial values of columns, by name; the others get their
+                    default.
+
+        """
+        super().__init__(unique_id, model)
+        agent_set._attach(self)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+
+class AgentSet:
+    """Columnar (struct-of-arrays) storage for the agents of one ColumnAgent
+    class: one typed NumPy array per Column attribute, with a row per agent.
+
+    Columns are indexed by row, up to the highest row in use; rows of
+    removed agents are marked dead in alive and reused by later agents. The
+    arrays are reallocated when the set grows past its capacity, so do not
+    keep column arrays across calls to create.
+
+    """
+
+    def __init__(self, model: Model, agent_class: type, capacity: int = 1024) -> None:
+        """Create a new, empty AgentSet.
+
+        Args:
+            model: The model the agents belong to.
+            agent_class: The ColumnAgent subclass of the agents.
+            capacity: Number of rows to allocate at first.
+
+        """
+        self.model = model
+        self.agent_class = agent_class
+        self._specs: Dict[str, Column] = dict()
+        for klass in reversed(agent_class.__mro__):
+            for name, value in vars(klass).items():
+                if isinstance(value, Column):
+                    self._specs[name] = value
+
+        capacity = max(capacity, 1)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.empty(capacity, dtype=spec.dtype)
+            for name, spec in self._specs.items()
+        }
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._agents: List[Optional[ColumnAgent]] = []
+        self._free_rows: List[int] = []
+        self._count = 0
+
+    def create(self, unique_id: Optional[int] = None, **values: Any) -> Any:
+        """Create an agent of the set's class.
+
+        Args:
+            unique_id: Defaults to model.next_id().
+            values: Initial column values, by name.
+
+        Returns:
+            The new agent.
+
+        """
+        if unique_id is None:
+            unique_id = self.model.next_id()
+        return self.agent_class(unique_id, self.model, self, **values)
+
+    def _attach(self, agent: ColumnAgent) -> None:
+        """ Give a new agent a row, with the default column values. """
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._agents[row] = agent
+        else:
+            row = len(self._agents)
+            if row == len(self._alive):
+                self._grow(2 * row)
+            self._agents.append(agent)
+        for name, spec in self._specs.items():
+            self.columns[name][row] = spec.default
+        self._alive[row] = True
+        self._count += 1
+        agent.agent_set = self
+        agent._row = row
+
+    def _grow(self, capacity: int) -> None:
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: len(column)] = column
+            self.columns[name] = grown
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: len(self._alive)] = self._alive
+        self._alive = alive
+
+    def remove(self, agent: ColumnAgent) -> None:
+        """Remove an agent from the set and free its row. The agent can no
+        longer read its columns.
+
+        """
+        row = agent._row
+        if agent.agent_set is not self or self._agents[row] is not agent:
+            raise Exception(
+                "Agent {} is not in this AgentSet".format(repr(agent.unique_id))
+            )
+        for column in self.columns.values():
+            if column.dtype == object:
+                column[row] = None
+        self._alive[row] = False
+        self._agents[row] = None
+        self._free_rows.append(row)
+        self._count -= 1
+        agent.agent_set = None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return the column of an attribute, a writable view with a row
+        per agent slot, e.g. agents["energy"] -= living_cost. Rows of
+        removed agents are included; see alive.
+
+        """
+        return self.columns[name][: len(self._agents)]
+
+    def __setitem__(self, name: str, values: Any) -> None:
+        """Set an attribute of every agent, from a value or an array with a
+        row per agent slot, like the one __getitem__ returns.
+
+        """
+        self.columns[name][: len(self._agents)] = values
+
+    @property
+    def alive(self) -> np.ndarray:
+        """ Boolean array of the rows holding an agent. """
+        return self._alive[: len(self._agents)]
+
+    def select(self, mask: np.ndarray) -> List[Any]:
+        """Return the live agents of the rows where mask is True, e.g.
+        agents.select(agents["energy"] <= 0).
+
+        """
+        agents = self._agents
+        return [agents[row] for row in np.flatnonzero(mask & self.alive).tolist()]
+
+    def values(self, name: str) -> np.ndarray:
+        """ Return a copy of an attribute of the live agents, in row order. """
+        return self[name][self.alive]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Any]:
+        """ Iterate over the live agents, in row order. """
+        return (agent for agent in self._agents if agent is not None)
+
+    def __contains__(self, agent: Any) -> bool:
+        return (
+            getattr(agent, "agent_set", None) is self
+            and self._agents[agent._row] is agent
+        )
@@ -9,10 +9,13 @@ import copy
 import random
 from itertools import product, count
 from multiprocessing import Pool, cpu_count
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from collections import OrderedDict
 
+from .stopping import as_criterion
+
 
 class ParameterError(TypeError):
     MESSAGE = (
@@ -59,6 +62,8 @@ class FixedBatchRunner:
         model_reporters=None,
         agent_reporters=None,
         display_progress=True,
+        seed=None,
+        stopping=None,
     ):
         """Create a new BatchRunner for a given model with the given
         parameters.
@@ -89,6 +94,16 @@ class FixedBatchRunner:
                 collected at the level of each agent present in the model at
                 the end of the run.
             display_progress: Display progress bar with time estimation?
+            seed: If set, every model is passed a seed keyword argument: the
+                child of this root seed spawned for its iteration number. The
+                runs are then reproducible, and the runs of every parameter
+                set use the same random numbers (common random numbers).
+            stopping: Optional StoppingCriterion, or list of criteria, from
+                mesa_fork.stopping, to end runs before max_steps, e.g. on a
+                plateau. Every run checks its own copy. The reason each run
+                stopped is collected as the stop_reason model variable.
+                BatchRunnerMP pickles the criteria, so give their variables
+                as attribute names or module-level functions, not lambdas.
 
         """
         self.model_cls = model_cls
@@ -108,7 +123,7 @@ class FixedBatchRunner:
         self.model_reporters = model_reporters
         self.agent_reporters = agent_reporters
 
-        if self.model_reporters:
+        if self.model_reporters or stopping is not None:
             self.model_vars = {}
 
         if self.agent_reporters:
@@ -120,6 +135,12 @@ class FixedBatchRunner:
 
         self.display_progress = display_progress
 
+        self.seed = seed
+        self.stopping = stopping
+        self.iteration_seeds = (
+            None if seed is None else np.random.SeedSequence(seed).spawn(iterations)
+        )
+
     def _make_model_args(self):
         """Prepare all combinations of parameter values for `run_all`
 
@@ -157,10 +178,20 @@ class FixedBatchRunner:
         with tqdm(total_iterations, disable=not self.display_progress) as pbar:
             for i, kwargs in enumerate(all_kwargs):
                 param_values = all_param_values[i]
-                for _ in range(self.iterations):
-                    self.run_iteration(kwargs, param_values, next(run_count))
+                for iteration in range(self.iterations):
+                    self.run_iteration(
+                        self._seeded(kwargs, iteration),
+                        param_values,
+                        next(run_count),
+                    )
                     pbar.update()
 
+    def _seeded(self, kwargs, iteration):
+        """ Add the seed of the iteration to the model kwargs, if seeding. """
+        if self.iteration_seeds is None:
+            return kwargs
+        return dict(kwargs, seed=self.iteration_seeds[iteration])
+
     def run_iteration(self, kwargs, param_values, run_count):
         model = self.model_cls(**kwargs)
         results = self.run_model(model)
@@ -169,8 +200,7 @@ class FixedBatchRunner:
         else:
             model_key = (run_count,)
 
-        if self.model_reporters:
-            self.model_vars[model_key] = self.collect_model_vars(model)
+        self._record_model_vars(model_key, model)
         if self.agent_reporters:
             agent_vars = self.collect_agent_vars(model)
             for agent_id, reports in agent_vars.items():
@@ -201,8 +231,11 @@ class FixedBatchRunner:
         in your subclass.
 
         """
-        while model.running and model.schedule.steps < self.max_steps:
-            model.step()
+        if self.stopping is None:
+            while model.running and model.schedule.steps < self.max_steps:
+                model.step()
+        else:
+            model.stop_reason = run_until_stopped(model, self.stopping, self.max_steps)
 
         if hasattr(model, "datacollector"):
             return model.datacollector
@@ -217,6 +250,14 @@ class FixedBatchRunner:
 
         return model_vars
 
+    def _record_model_vars(self, model_key, model):
+        """ Store the model-level variables and stop reason of a run. """
+        if self.model_reporters:
+            self.model_vars[model_key] = self.collect_model_vars(model)
+        if self.stopping is not None:
+            model_vars = self.model_vars.setdefault(model_key, OrderedDict())
+            model_vars["stop_reason"] = model.stop_reason
+
     def collect_agent_vars(self, model):
         """ Run reporters and collect agent-level variables. """
         agent_vars = OrderedDict()
@@ -287,6 +328,25 @@ class FixedBatchRunner:
         return ordered
 
 
+def run_until_stopped(model, stopping, max_steps):
+    """Step a model until it stops running, reaches max_steps or meets a
+    copy of the stopping criteria.
+
+    Returns:
+        The reason the run stopped: the criterion's, "model" or "max_steps".
+    """
+    criterion = as_criterion(copy.deepcopy(stopping))
+    criterion.reset(model)
+    while model.running:
+        if model.schedule.steps >= max_steps:
+            return "max_steps"
+        model.step()
+        reason = criterion.check(model)
+        if reason is not None:
+            return reason
+    return "model"
+
+
 class ParameterProduct:
     def __init__(self, variable_parameters):
         self.param_names, self.param_lists = zip(
@@ -355,6 +415,8 @@ class BatchRunner(FixedBatchRunner):
         model_reporters=None,
         agent_reporters=None,
         display_progress=True,
+        seed=None,
+        stopping=None,
     ):
         """Create a new BatchRunner for a given model with the given
         parameters.
@@ -385,6 +447,8 @@ class BatchRunner(FixedBatchRunner):
                 collected at the level of each agent present in the model at
                 the end of the run.
             display_progress: Display progress bar with time estimation?
+            seed: Root seed of the runs, see FixedBatchRunner.
+            stopping: Criteria to end runs early, see FixedBatchRunner.
 
         """
         if variable_parameters is None:
@@ -397,6 +461,8 @@ class BatchRunner(FixedBatchRunner):
                 model_reporters,
                 agent_reporters,
                 display_progress,
+                seed,
+                stopping,
             )
         else:
             super().__init__(
@@ -408,6 +474,8 @@ class BatchRunner(FixedBatchRunner):
                 model_reporters,
                 agent_reporters,
                 display_progress,
+                seed,
+                stopping,
             )
 
 
@@ -440,7 +508,8 @@ class BatchRunnerMP(BatchRunner):
         Due to multiprocessing requirements of @StaticMethod takes different input, hence the similar function
         Returns:
             List of list with the form:
-            [[model_object, dictionary_of_kwargs, max_steps, iterations]]
+            [[model_object, dictionary_of_kwargs, max_steps, iterations, seed,
+              stopping]]
         """
         total_iterations = self.iterations
         all_kwargs = []
@@ -453,8 +522,18 @@ class BatchRunnerMP(BatchRunner):
                 # run each iterations specific number of times
                 for iter in range(self.iterations):
                     kwargs_repeated = kwargs.copy()
+                    seed = None
+                    if self.iteration_seeds is not None:
+                        seed = self.iteration_seeds[iter]
                     all_kwargs.append(
-                        [self.model_cls, kwargs_repeated, self.max_steps, iter]
+                        [
+                            self.model_cls,
+                            kwargs_repeated,
+                            self.max_steps,
+                            iter,
+                            seed,
+                            self.stopping,
+                        ]
                     )
 
         elif len(self.fixed_parameters):
@@ -477,6 +556,8 @@ class BatchRunnerMP(BatchRunner):
             iter_args[1] = key word arguments needed for model object
             iter_args[2] = maximum number of steps for model
             iter_args[3] = number of time to run model for stochastic/random variation with same parameters
+            iter_args[4] = seed of the model, or None to leave it unseeded
+            iter_args[5] = stopping criteria, or None to run until max_steps
         :return:
             tuple of param values which serves as a unique key for model results
             model object
@@ -486,11 +567,19 @@ class BatchRunnerMP(BatchRunner):
         kwargs = iter_args[1]
         max_steps = iter_args[2]
         iteration = iter_args[3]
+        seed = iter_args[4] if len(iter_args) > 4 else None
+        stopping = iter_args[5] if len(iter_args) > 5 else None
 
         # instantiate version of model with correct parameters
-        model = model_i(**kwargs)
-        while model.running and model.schedule.steps < max_steps:
-            model.step()
+        if seed is None:
+            model = model_i(**kwargs)
+        else:
+            model = model_i(**kwargs, seed=seed)
+        if stopping is None:
+            while model.running and model.schedule.steps < max_steps:
+                model.step()
+        else:
+            model.stop_reason = run_until_stopped(model, stopping, max_steps)
 
         # add iteration number to dictionary to make unique_key
         kwargs["iteration"] = iteration
@@ -509,8 +598,7 @@ class BatchRunnerMP(BatchRunner):
         """
         # Take results and convert to dictionary so dataframe can be called
         for model_key, model in results.items():
-            if self.model_reporters:
-                self.model_vars[model_key] = self.collect_model_vars(model)
+            self._record_model_vars(model_key, model)
             if self.agent_reporters:
                 agent_vars = self.collect_agent_vars(model)
                 for agent_id, reports in agent_vars.items():
@@ -4,20 +4,66 @@ The model class for Mesa framework.
 Core Objects: Model
 
 """
+import pickle
 import random
+import zlib
+from time import perf_counter
+
+import numpy as np
 
 # mypy
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Union
+
+from .stopping import as_criterion
+
+SeedT = Union[None, int, np.random.SeedSequence]
+
+
+class Checkpoint:
+    """A snapshot of a model, taken with Model.checkpoint.
+
+    The model is pickled with protocol 5; the data of its NumPy arrays (grid
+    occupancy, property layers, agent columns, ...) is kept out of band, as
+    raw buffers next to the pickle, instead of being copied into it.
+
+    """
+
+    def __init__(self, data: bytes, buffers: List[bytearray]) -> None:
+        self.data = data
+        self.buffers = buffers
+
+    @property
+    def nbytes(self) -> int:
+        """ The size of the snapshot. """
+        return len(self.data) + sum(len(buffer) for buffer in self.buffers)
+
+    def save(self, path: str) -> None:
+        """ Write the snapshot to a file. """
+        with open(path, "wb") as f:
+            pickle.dump((self.data, self.buffers), f, protocol=5)
+
+    @staticmethod
+    def load(path: str) -> "Checkpoint":
+        """ Read a snapshot written by save. """
+        with open(path, "rb") as f:
+            data, buffers = pickle.load(f)
+        return Checkpoint(data, buffers)
 
 
 class Model:
     """ Base class for models. """
 
     def __new__(cls, *args: Any, **kwargs: Any) -> Any:
-        """Create a new model object and instantiate its RNG automatically."""
-        cls._seed = kwargs.get("seed", None)
-        cls.random = random.Random(cls._seed)
-        return object.__new__(cls)
+        """Create a new model object and instantiate its RNGs automatically.
+
+        The seed keyword argument, an int, a numpy.random.SeedSequence (e.g.
+        one spawned for a batch run) or None for fresh entropy, seeds the
+        model's own random and np_random streams and its named child streams.
+
+        """
+        model = object.__new__(cls)
+        model._init_random(kwargs.get("seed", None))
+        return model
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         """Create a new model. Overload this method with the actual code to
@@ -33,31 +79,158 @@ class Model:
         self.schedule = None
         self.current_id = 0
 
-    def run_model(self) -> None:
+    def run_model(self, stopping: Any = None) -> None:
         """Run the model until the end condition is reached. Overload as
         needed.
 
+        If the schedule records stats (see BaseScheduler.enable_stats), the
+        wall time of every step is recorded too.
+
+        Args:
+            stopping: Optional StoppingCriterion, or list of criteria, from
+                      mesa_fork.stopping, checked after every step. The
+                      reason the run stopped is kept as stop_reason: the
+                      criterion's, or "model" when running turned False.
+
         """
+        criterion = as_criterion(stopping)
+        if criterion is not None:
+            criterion.reset(self)
+        self.stop_reason = None
+
         while self.running:
-            self.step()
+            # Models are not required to have a schedule
+            stats = getattr(getattr(self, "schedule", None), "stats", None)
+            if stats is None:
+                self.step()
+            else:
+                step = self.schedule.steps
+                start = perf_counter()
+                self.step()
+                stats.record_step(step, perf_counter() - start)
+
+            if criterion is not None:
+                self.stop_reason = criterion.check(self)
+                if self.stop_reason is not None:
+                    return
+        self.stop_reason = "model"
 
     def step(self) -> None:
         """ A single step. Fill in here. """
         pass
 
+    def checkpoint(self) -> Checkpoint:
+        """Take a snapshot of the whole model: grid, agents, schedule order
+        and RNG states. Everything the model references must be picklable;
+        e.g. lambda reporters are not.
+
+        Returns:
+            The Checkpoint, to pass to restore.
+
+        """
+        buffers: List[pickle.PickleBuffer] = []
+        data = pickle.dumps(self, protocol=5, buffer_callback=buffers.append)
+        # The buffers still point into the live arrays, so copy them out
+        return Checkpoint(data, [bytearray(buffer.raw()) for buffer in buffers])
+
+    @classmethod
+    def restore(cls, checkpoint: Checkpoint) -> Any:
+        """Create a new model from a checkpoint, which can be restored any
+        number of times, e.g. to branch runs from a shared warm-up. Change
+        parameters on the returned model and call reset_randomizer with a
+        new seed to make the branches differ.
+
+        Args:
+            checkpoint: A Checkpoint taken with checkpoint.
+
+        Returns:
+            The restored model.
+
+        """
+        # Every restored model gets its own copy of the array data
+        buffers = [bytearray(buffer) for buffer in checkpoint.buffers]
+        model = pickle.loads(checkpoint.data, buffers=buffers)
+        if not isinstance(model, cls):
+            raise Exception(
+                "Checkpoint holds a {}, not a {}".format(
+                    type(model).__name__, cls.__name__
+                )
+            )
+        return model
+
     def next_id(self) -> int:
         """ Return the next unique ID for agents, increment current_id"""
         self.current_id += 1
         return self.current_id
 
     def reset_randomizer(self, seed: Optional[int] = None) -> None:
-        """Reset the model random number generator.
+        """Reset the model random number generators.
 
         Args:
             seed: A new seed for the RNG; if None, reset using the current seed
         """
 
         if seed is None:
-            seed = self._seed
-        self.random.seed(seed)
+            # Without an explicit seed, replay the entropy drawn at creation
+            seed = self._seed if self._seed is not None else self._seed_sequence
+        self._init_random(seed)
+
+    def _init_random(self, seed: SeedT) -> None:
+        """ Create the RNGs of the model from seed, see __new__. """
+        if isinstance(seed, np.random.SeedSequence):
+            # A private copy, so that spawn_seeds does not advance a sequence
+            # shared with other models, e.g. those of one batch iteration
+            self._seed_sequence = np.random.SeedSequence(
+                seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size
+            )
+        else:
+            self._seed_sequence = np.random.SeedSequence(seed)
         self._seed = seed
+        self.random = random.Random(_python_seed(self._child_sequence("random")))
+        self.np_random = np.random.default_rng(self._child_sequence("numpy"))
+        self._streams: Dict[str, np.random.Generator] = dict()
+        self._random_streams: Dict[str, random.Random] = dict()
+
+    def rng_stream(self, name: str) -> np.random.Generator:
+        """Return the model's NumPy child stream for a subsystem, e.g. the
+        scheduler, the placement or the agents.
+
+        Streams depend only on the model seed and their name, not on which
+        other streams exist or were used, so a subsystem draws the same
+        numbers across runs that differ elsewhere (common random numbers).
+
+        Args:
+            name: Name of the stream.
+
+        """
+        if name not in self._streams:
+            self._streams[name] = np.random.default_rng(self._child_sequence(name))
+        return self._streams[name]
+
+    def random_stream(self, name: str) -> random.Random:
+        """ Like rng_stream, but a random.Random. """
+        if name not in self._random_streams:
+            sequence = self._child_sequence(name)
+            self._random_streams[name] = random.Random(_python_seed(sequence))
+        return self._random_streams[name]
+
+    def spawn_seeds(self, n: int) -> List[np.random.SeedSequence]:
+        """ Spawn n independent seeds from the model seed, e.g. for submodels. """
+        return self._seed_sequence.spawn(n)
+
+    def _child_sequence(self, name: str) -> np.random.SeedSequence:
+        """The child of the model's SeedSequence for a stream name, as
+        SeedSequence.spawn would derive it, with the name's CRC-32 as key.
+
+        """
+        root = self._seed_sequence
+        return np.random.SeedSequence(
+            root.entropy,
+            spawn_key=root.spawn_key + (zlib.crc32(name.encode()),),
+            pool_size=root.pool_size,
+        )
+
+
+def _python_seed(sequence: np.random.SeedSequence) -> int:
+    """ Derive a random.Random seed from a SeedSequence. """
+    return int.from_bytes(sequence.generate_state(4).tobytes(), "little")
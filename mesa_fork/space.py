@@ -6,7 +6,13 @@ Objects used to add a spatial component to a model.
 
 Grid: base grid, a simple list-of-lists.
 SingleGrid: grid which strictly enforces one object per cell.
-MultiGrid: extension to Grid where each cell is a set of objects.
+SparseGrid: SingleGrid which allocates its cells in chunks, on demand.
+HexGrid: SingleGrid with hexagonal cells.
+NetworkGrid: network space, agents live on the nodes of a CSR graph.
+ContinuousSpace: continuous 2D space with a cell-list spatial index.
+TileDecomposition: split of a grid into colored tiles with halos.
+SharedGridView: read-only view of a grid shared by another process.
+PropertyLayer: named NumPy layer of per-cell values attached to a grid.
 
 """
 # Instruction for PyLint to suppress variable name errors, since we have a
@@ -14,15 +20,25 @@ MultiGrid: extension to Grid where each cell is a set of objects.
 # pylint: disable=invalid-name
 
 import itertools
+import math
+import operator
+import random
+import sys
+from collections import OrderedDict
+from collections.abc import MutableSet, Set as AbstractSet
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
 
 import numpy as np
 
 from typing import (
     Any,
+    Callable,
     Dict,
     Iterable,
     Iterator,
     List,
+    NamedTuple,
     Optional,
     Set,
     Sequence,
@@ -38,6 +54,359 @@ GridContent = Union[Optional[Agent], Set[Agent]]
 # used in ContinuousSpace
 FloatCoordinate = Union[Tuple[float, float], np.ndarray]
 
+# Names of the shared memory blocks created by this process, see share_memory
+_owned_blocks: Set[str] = set()
+
+
+class _SlotColumn:
+    """Read-only view of one column of an array-backed grid, so that
+    ``grid[x][y]`` keeps working on top of the slot array.
+
+    """
+
+    __slots__ = ("_slots", "_agents")
+
+    def __init__(self, slots: np.ndarray, agents: List[Optional[Agent]]) -> None:
+        self._slots = slots
+        self._agents = agents
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __getitem__(self, y: Union[int, slice]) -> Any:
+        if isinstance(y, slice):
+            agents = self._agents
+            return [agents[slot] for slot in self._slots[y].tolist()]
+        return self._agents[self._slots.item(y)]
+
+    def __iter__(self) -> Iterator[Optional[Agent]]:
+        return iter(self[:])
+
+
+class _SlotColumns:
+    """ Read-only list-of-lists view of an array-backed grid. """
+
+    __slots__ = ("_slots", "_agents")
+
+    def __init__(self, slots: np.ndarray, agents: List[Optional[Agent]]) -> None:
+        self._slots = slots
+        self._agents = agents
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __getitem__(self, x: Union[int, slice]) -> Any:
+        if isinstance(x, slice):
+            return [_SlotColumn(col, self._agents) for col in self._slots[x]]
+        return _SlotColumn(self._slots[x], self._agents)
+
+    def __iter__(self) -> Iterator[_SlotColumn]:
+        return iter(self[:])
+
+
+class CacheInfo(NamedTuple):
+    """ Neighborhood cache statistics, see Grid.neighborhood_cache_info. """
+
+    hits: int
+    misses: int
+    maxsize: Optional[int]
+    currsize: int
+    nbytes: int
+
+
+class NeighborhoodCache:
+    """Cache of neighborhoods, keyed on (pos, moore, include_center, radius).
+
+    Keeps hit/miss counters and an estimate of the memory held by the
+    cached values. Unbounded caches are plain dictionaries; with maxsize or
+    max_bytes set, the least recently used entries are evicted first. With
+    maxsize=0 nothing is cached.
+
+    """
+
+    # Approximate size of a cached coordinate tuple, with its list slot
+    _COORD_SIZE = sys.getsizeof((0, 0)) + 8
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        compact: bool = False,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        """Create a new, empty cache.
+
+        Args:
+            maxsize: Maximal number of neighborhoods to keep, or None for
+                     no limit.
+            compact: Store neighborhoods as int32 arrays of cell indices
+                     instead of lists of coordinate tuples.
+            max_bytes: Maximal approximate memory held by the cached
+                       neighborhoods, or None for no limit.
+
+        """
+        self.maxsize = maxsize
+        self.compact = compact
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bounded = maxsize is not None or max_bytes is not None
+        self._entries: Dict[Any, Any] = OrderedDict() if self._bounded else dict()
+        # Sizes of the entries and their total, only kept when bounded
+        self._sizes: Dict[Any, int] = dict()
+        self._nbytes = 0
+        if self._bounded:
+            self.get = self._get_lru  # type: ignore
+            self.put = self._put_lru  # type: ignore
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any) -> Any:
+        """ Return the cached value for key, or None on a miss. """
+        value = self._entries.get(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: Any, value: Any) -> None:
+        """ Store value under key; bounded caches evict old entries first. """
+        if self.maxsize != 0:
+            self._entries[key] = value
+
+    def _get_lru(self, key: Any) -> Any:
+        value = self._entries.get(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)  # type: ignore
+        return value
+
+    def _put_lru(self, key: Any, value: Any) -> None:
+        if self.maxsize == 0:
+            return
+
+        entries, sizes = self._entries, self._sizes
+        if key in entries:
+            del entries[key]
+            self._nbytes -= sizes.pop(key)
+        size = self._sizeof(value)
+        entries[key] = value
+        sizes[key] = size
+        self._nbytes += size
+
+        maxsize = len(entries) if self.maxsize is None else self.maxsize
+        max_bytes = self._nbytes if self.max_bytes is None else self.max_bytes
+        while entries and (len(entries) > maxsize or self._nbytes > max_bytes):
+            evicted, _ = entries.popitem(last=False)  # type: ignore
+            self._nbytes -= sizes.pop(evicted)
+
+    def clear(self) -> None:
+        """ Drop all entries; the hit and miss counters are kept. """
+        self._entries.clear()
+        self._sizes.clear()
+        self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """ Approximate memory held by the cached neighborhoods. """
+        if self._bounded:
+            return self._nbytes
+        return sum(self._sizeof(value) for value in self._entries.values())
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            self.hits, self.misses, self.maxsize, len(self._entries), self.nbytes
+        )
+
+    @classmethod
+    def _sizeof(cls, value: Any) -> int:
+        """ Approximate size in bytes of a cached neighborhood, in O(1). """
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        return sys.getsizeof(value) + len(value) * cls._COORD_SIZE
+
+
+class EmptyCells(MutableSet):
+    """Set of empty cells with O(1) add, discard and uniform random choice.
+
+    The cells are kept in a dense list plus a cell -> index map; discarding
+    a cell moves the last cell into its place. Because it can be indexed,
+    ``random.choice(empties)`` works directly, and the draw is deterministic
+    for a given RNG state and history of adds and discards.
+
+    """
+
+    def __init__(self, cells: Iterable[Coordinate] = ()) -> None:
+        self._cells: List[Coordinate] = list(cells)
+        self._index: Dict[Coordinate, int] = {
+            cell: i for i, cell in enumerate(self._cells)
+        }
+
+    def __contains__(self, cell: Any) -> bool:
+        return cell in self._index
+
+    def __iter__(self) -> Iterator[Coordinate]:
+        return iter(self._cells)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __getitem__(self, i: int) -> Coordinate:
+        return self._cells[i]
+
+    def __repr__(self) -> str:
+        return "{}({!r})".format(type(self).__name__, self._cells)
+
+    def add(self, cell: Coordinate) -> None:
+        if cell not in self._index:
+            self._index[cell] = len(self._cells)
+            self._cells.append(cell)
+
+    def discard(self, cell: Coordinate) -> None:
+        i = self._index.pop(cell, None)
+        if i is None:
+            return
+        last = self._cells.pop()
+        if i < len(self._cells):
+            self._cells[i] = last
+            self._index[last] = i
+
+
+class _SparseColumn:
+    """ Read-only view of one column of a SparseGrid. """
+
+    __slots__ = ("_grid", "_x")
+
+    def __init__(self, grid: "SparseGrid", x: int) -> None:
+        self._grid = grid
+        self._x = x
+
+    def __len__(self) -> int:
+        return self._grid.height
+
+    def __getitem__(self, y: Union[int, slice]) -> Any:
+        if isinstance(y, slice):
+            return [self._grid._get_cell(self._x, y) for y in range(len(self))[y]]
+        return self._grid._get_cell(self._x, y)
+
+    def __iter__(self) -> Iterator[Optional[Agent]]:
+        return iter(self[:])
+
+
+class _SparseColumns:
+    """ Read-only list-of-lists view of a SparseGrid. """
+
+    __slots__ = ("_grid",)
+
+    def __init__(self, grid: "SparseGrid") -> None:
+        self._grid = grid
+
+    def __len__(self) -> int:
+        return self._grid.width
+
+    def __getitem__(self, x: Union[int, slice]) -> Any:
+        if isinstance(x, slice):
+            return [_SparseColumn(self._grid, x) for x in range(len(self))[x]]
+        return _SparseColumn(self._grid, x)
+
+    def __iter__(self) -> Iterator[_SparseColumn]:
+        return iter(self[:])
+
+
+class _SparseEmpties(AbstractSet):
+    """Implicit set of the empty cells of a SparseGrid, derived from the
+    chunk occupancy instead of listing every cell.
+
+    Like EmptyCells it can be indexed, so ``random.choice(empties)`` works;
+    the i-th empty cell, in (x, y) order, is found by skipping over the
+    occupied cells before it, in O(agents) time.
+
+    """
+
+    __slots__ = ("_grid",)
+
+    def __init__(self, grid: "SparseGrid") -> None:
+        self._grid = grid
+
+    def __contains__(self, cell: Any) -> bool:
+        return not self._grid.out_of_bounds(cell) and self._grid.is_cell_empty(cell)
+
+    def __len__(self) -> int:
+        return self._grid.width * self._grid.height - self._grid._agent_count
+
+    def __iter__(self) -> Iterator[Coordinate]:
+        grid = self._grid
+        for x in range(grid.width):
+            for y in range(grid.height):
+                if grid.is_cell_empty((x, y)):
+                    yield x, y
+
+    def __getitem__(self, index: int) -> Coordinate:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("empty cell index out of range")
+
+        grid = self._grid
+        occupied = sorted(x * grid.height + y for _, x, y in grid.iter_occupied_cells())
+        # The index-th flat index missing from occupied
+        for flat in occupied:
+            if flat > index:
+                break
+            index += 1
+        return divmod(index, grid.height)
+
+    @classmethod
+    def _from_iterable(cls, cells: Iterable[Coordinate]) -> Set[Coordinate]:
+        # Results of set operations are plain sets
+        return set(cells)
+
+    def add(self, cell: Coordinate) -> None:
+        pass
+
+    def discard(self, cell: Coordinate) -> None:
+        pass
+
+
+def _window_sum(
+    values: np.ndarray, radius: int, moore: bool, torus: bool
+) -> np.ndarray:
+    """Sum a 2D array over the radius-r Moore or Von Neumann window around
+    every cell, center included. See Grid.window_sum.
+
+    """
+    r = radius
+    padded = np.pad(values, r, mode="wrap" if torus else "constant")
+
+    if moore:
+        k = 2 * r + 1
+        table = np.zeros(
+            (padded.shape[0] + 1, padded.shape[1] + 1),
+            dtype=np.result_type(values.dtype, np.int64),
+        )
+        table[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+        sums = table[k:, k:] - table[:-k, k:] - table[k:, :-k] + table[:-k, :-k]
+    else:
+        # Prefix sums along y; each dx row of the diamond is one
+        # difference of two prefix sums.
+        w, h = values.shape
+        table = np.zeros(
+            (padded.shape[0], padded.shape[1] + 1),
+            dtype=np.result_type(values.dtype, np.int64),
+        )
+        table[:, 1:] = padded.cumsum(axis=1)
+        sums = np.zeros((w, h), dtype=table.dtype)
+        for dx in range(-r, r + 1):
+            m = r - abs(dx)
+            rows = table[r + dx : r + dx + w]
+            sums += rows[:, r + m + 1 : r + m + 1 + h] - rows[:, r - m : r - m + h]
+
+    return sums
+
 
 def accept_tuple_argument(wrapped_function):
     """Decorator to allow grid methods that take a list of (x, y) coord tuples
@@ -55,6 +424,149 @@ def accept_tuple_argument(wrapped_function):
     return wrapper
 
 
+class PropertyLayer:
+    """A named, typed NumPy layer of per-cell values, such as a resource
+    level, a pheromone concentration or the time of the last defection.
+
+    The values are stored in the data attribute, a (width, height) array
+    indexed like the grid, so arbitrary NumPy expressions work on it
+    directly. The methods below cover the common vectorized updates.
+
+    Conditions passed to the methods are either a boolean (width, height)
+    mask or a function taking the data array and returning such a mask,
+    e.g. ``lambda data: data > 0``.
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        width: int,
+        height: int,
+        default_value: Any = 0,
+        dtype: Any = np.float64,
+        torus: bool = False,
+    ) -> None:
+        """Create a new property layer.
+
+        Args:
+            name: Name of the layer, unique within a grid.
+            width, height: The width and height of the layer.
+            default_value: Initial value of every cell.
+            dtype: NumPy dtype of the values.
+            torus: Boolean whether the layer wraps when diffusing.
+
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.data = np.full((width, height), default_value, dtype=dtype)
+
+    def _mask(self, condition: Any) -> Any:
+        if callable(condition):
+            return condition(self.data)
+        return condition
+
+    def _check_floating(self, operation: str) -> None:
+        """ Refuse updates whose fractions an integer layer would truncate. """
+        if not np.issubdtype(self.data.dtype, np.inexact):
+            raise ValueError(
+                "Cannot {} property layer {} of dtype {}; use a float dtype".format(
+                    operation, repr(self.name), self.data.dtype
+                )
+            )
+
+    def get_cell(self, pos: Coordinate) -> Any:
+        """ Return the value of a single cell. """
+        x, y = pos
+        return self.data[x, y]
+
+    def set_cell(self, pos: Coordinate, value: Any) -> None:
+        """ Set the value of a single cell. """
+        x, y = pos
+        self.data[x, y] = value
+
+    def set_cells(self, value: Any, condition: Any = None) -> None:
+        """Set all cells, or the cells matching condition, to value.
+
+        Args:
+            value: Scalar, or (width, height) array of new values.
+            condition: Optional mask or function selecting the cells.
+
+        """
+        if condition is None:
+            self.data[...] = value
+        else:
+            np.copyto(self.data, value, where=self._mask(condition))
+
+    def modify_cells(
+        self, operation: Any, value: Any = None, condition: Any = None
+    ) -> None:
+        """Apply a vectorized operation to all cells, or to the cells
+        matching condition.
+
+        Args:
+            operation: A NumPy ufunc, such as np.add used as
+                       operation(data, value) or np.sqrt used as
+                       operation(data); or a function taking the data array,
+                       and value if given, and returning the new values.
+            value: Second operand, required by binary ufuncs and refused
+                   by unary ones.
+            condition: Optional mask or function selecting the cells.
+
+        """
+        if isinstance(operation, np.ufunc):
+            if operation.nin == 2 and value is None:
+                raise ValueError(
+                    "{} is a binary ufunc and needs a value".format(operation.__name__)
+                )
+            if operation.nin == 1 and value is not None:
+                raise ValueError(
+                    "{} is a unary ufunc and takes no value".format(operation.__name__)
+                )
+        if value is None:
+            result = operation(self.data)
+        else:
+            result = operation(self.data, value)
+        self.set_cells(result, condition)
+
+    def decay(self, rate: float, condition: Any = None) -> None:
+        """ Multiply the values by (1 - rate); the layer must be floating. """
+        self._check_floating("decay")
+        self.set_cells(self.data * (1 - rate), condition)
+
+    def diffuse(self, rate: float, moore: bool = True) -> None:
+        """Spread a fraction of every cell's value to its neighbors.
+
+        Every cell hands rate * value, in equal parts, to the cells of its
+        radius-1 neighborhood (8 if moore, else 4). On a non-toroidal layer,
+        the parts that would leave the grid stay in the cell, so the total
+        is conserved. The layer must be floating.
+
+        """
+        self._check_floating("diffuse")
+        k = 8 if moore else 4
+        share = self.data * (rate / k)
+        received = _window_sum(share, 1, moore, self.torus) - share
+        if self.torus:
+            kept = self.data - rate * self.data
+        else:
+            ones = np.ones(self.data.shape, dtype=np.int64)
+            given = _window_sum(ones, 1, moore, False) - 1
+            kept = self.data - share * given
+        self.data[...] = kept + received
+
+    def select_cells(self, condition: Any) -> List[Coordinate]:
+        """ Return the coordinates of the cells matching condition. """
+        xs, ys = np.nonzero(self._mask(condition))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def aggregate(self, operation: Any = np.sum) -> Any:
+        """ Reduce the layer to a single value, e.g. with np.mean. """
+        return operation(self.data)
+
+
 class Grid:
     """Base class for a square grid.
 
@@ -102,6 +614,23 @@ class Grid:
         self.width = width
         self.torus = torus
 
+        self._init_cells()
+        self._init_empties()
+
+        # Named per-cell property layers
+        self.properties: Dict[str, PropertyLayer] = dict()
+
+        # Shared memory blocks backing the grid arrays, see share_memory
+        self._shared_memory: Dict[str, shared_memory.SharedMemory] = dict()
+
+        # Neighborhood Cache
+        self._neighborhood_cache = NeighborhoodCache()
+
+        # Offset stencils, keyed on (moore, include_center, radius)
+        self._stencils: Dict[Tuple[bool, bool, int], Tuple[np.ndarray, list]] = dict()
+
+    def _init_cells(self) -> None:
+        """ Allocate the cells of the grid as a list-of-lists. """
         self.grid: List[List[GridContent]] = []
 
         for x in range(self.width):
@@ -110,11 +639,11 @@ class Grid:
                 col.append(self.default_val())
             self.grid.append(col)
 
-        # Add all cells to the empties list.
-        self.empties = set(itertools.product(*(range(self.width), range(self.height))))
-
-        # Neighborhood Cache
-        self._neighborhood_cache: Dict[Any, List[Coordinate]] = dict()
+    def _init_empties(self) -> None:
+        """ Add all cells to the empties list. """
+        self.empties = EmptyCells(
+            itertools.product(*(range(self.width), range(self.height)))
+        )
 
     @staticmethod
     def default_val() -> None:
@@ -269,35 +798,199 @@ class Grid:
             if not including the center).
 
         """
+        cache = self._neighborhood_cache
         cache_key = (pos, moore, include_center, radius)
-        neighborhood = self._neighborhood_cache.get(cache_key, None)
+        neighborhood = cache.get(cache_key)
 
         if neighborhood is None:
-            coordinates: Set[Coordinate] = set()
+            neighborhood = self._build_neighborhood(pos, moore, include_center, radius)
+            if cache.compact:
+                height = self.height
+                cells = [x * height + y for x, y in neighborhood]
+                cache.put(cache_key, np.array(cells, dtype=np.int32))
+            else:
+                cache.put(cache_key, neighborhood)
+        elif cache.compact:
+            height = self.height
+            neighborhood = [divmod(i, height) for i in neighborhood.tolist()]
 
-            x, y = pos
-            for dy in range(-radius, radius + 1):
-                for dx in range(-radius, radius + 1):
-                    if dx == 0 and dy == 0 and not include_center:
-                        continue
-                    # Skip coordinates that are outside manhattan distance
-                    if not moore and abs(dx) + abs(dy) > radius:
-                        continue
+        return neighborhood
+
+    def _get_neighborhood_cells(
+        self, pos: Coordinate, moore: bool, include_center: bool, radius: int
+    ) -> np.ndarray:
+        """Return the neighborhood of get_neighborhood as an array of flat
+        cell indices, cached next to it; compact caches hold the same array.
 
-                    coord = (x + dx, y + dy)
+        """
+        cache = self._neighborhood_cache
+        if cache.compact:
+            cache_key: Tuple[Any, ...] = (pos, moore, include_center, radius)
+            dtype: Any = np.int32
+        else:
+            # Native indices, which take uses without a cast
+            cache_key = (pos, moore, include_center, radius, "cells")
+            dtype = np.intp
+        cells = cache.get(cache_key)
 
-                    if self.out_of_bounds(coord):
-                        # Skip if not a torus and new coords out of bounds.
-                        if not self.torus:
-                            continue
-                        coord = self.torus_adj(coord)
+        if cells is None:
+            neighborhood = self._build_neighborhood(pos, moore, include_center, radius)
+            height = self.height
+            cells = np.array([x * height + y for x, y in neighborhood], dtype=dtype)
+            cache.put(cache_key, cells)
 
-                    coordinates.add(coord)
+        return cells
 
-            neighborhood = coordinates
-            self._neighborhood_cache[cache_key] = neighborhood
+    def _build_neighborhood(
+        self, pos: Coordinate, moore: bool, include_center: bool, radius: int
+    ) -> List[Coordinate]:
+        """Compute the neighborhood of get_neighborhood, without the cache;
+        kept apart so that cache hits do not pay for its closures.
 
-        return neighborhood
+        """
+        _, offsets = self._get_pos_stencil(pos, moore, include_center, radius)
+
+        x, y = pos
+        if self.torus:
+            width, height = self.width, self.height
+            neighborhood = [((x + dx) % width, (y + dy) % height) for dx, dy in offsets]
+            # On grids narrower than the neighborhood, offsets wrap onto
+            # the same cell more than once.
+            if 2 * radius >= min(width, height):
+                neighborhood = list(dict.fromkeys(neighborhood))
+            return neighborhood
+
+        return [
+            (x + dx, y + dy)
+            for dx, dy in offsets
+            if not self.out_of_bounds((x + dx, y + dy))
+        ]
+
+    def set_neighborhood_cache(
+        self,
+        maxsize: Optional[int] = None,
+        compact: bool = False,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        """Replace the neighborhood cache, dropping its current contents.
+
+        Args:
+            maxsize: Maximal number of cached neighborhoods; the least
+                     recently used ones are evicted first. None for no
+                     limit, 0 to disable caching.
+            compact: Store neighborhoods as int32 arrays of cell indices
+                     instead of lists of coordinate tuples. Lookups then
+                     rebuild the coordinate list on every hit, but memory
+                     use stays a few bytes per cell.
+            max_bytes: Maximal approximate memory held by the cached
+                       neighborhoods, evicting the least recently used ones
+                       first. None for no limit.
+
+        Unbounded caches skip the bookkeeping of the least recently used
+        entries and of their sizes, so they are the fastest.
+
+        """
+        self._neighborhood_cache = NeighborhoodCache(maxsize, compact, max_bytes)
+
+    def neighborhood_cache_info(self) -> CacheInfo:
+        """Return hits, misses, maxsize, current size and approximate bytes
+        held by the neighborhood cache.
+
+        """
+        return self._neighborhood_cache.info()
+
+    def _get_stencil(
+        self, moore: bool, include_center: bool, radius: int
+    ) -> Tuple[np.ndarray, List[Coordinate]]:
+        """Return the (dx, dy) offsets of a neighborhood, both as a (k, 2)
+        array and as a list of tuples. Offsets are ordered row by row.
+
+        """
+        key = (moore, include_center, radius)
+        stencil = self._stencils.get(key, None)
+
+        if stencil is None:
+            d = np.arange(-radius, radius + 1)
+            dx, dy = np.meshgrid(d, d)
+            dx, dy = dx.ravel(), dy.ravel()
+
+            keep = np.ones(dx.shape, dtype=bool)
+            if not moore:
+                # Skip coordinates that are outside manhattan distance
+                keep &= np.abs(dx) + np.abs(dy) <= radius
+            if not include_center:
+                keep &= (dx != 0) | (dy != 0)
+
+            offsets = np.stack([dx[keep], dy[keep]], axis=1)
+            stencil = (offsets, [tuple(o) for o in offsets.tolist()])
+            self._stencils[key] = stencil
+
+        return stencil
+
+    def _get_pos_stencil(
+        self, pos: Coordinate, moore: bool, include_center: bool, radius: int
+    ) -> Tuple[np.ndarray, List[Coordinate]]:
+        """ Return the stencil to use around pos; see _get_stencil. """
+        return self._get_stencil(moore, include_center, radius)
+
+    def _get_bulk_offsets(
+        self, pos: np.ndarray, moore: bool, include_center: bool, radius: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the dx and dy offsets to add to an (N, 2) array of
+        positions, as arrays broadcastable to (N, k).
+
+        """
+        offsets, _ = self._get_stencil(moore, include_center, radius)
+        return offsets[:, 0], offsets[:, 1]
+
+    def get_neighborhoods(
+        self,
+        positions: Union[Sequence[Coordinate], np.ndarray],
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Return the neighborhoods of many positions at once.
+
+        Args:
+            positions: Sequence or (N, 2) array of (x, y) positions.
+            moore: If True, use the Moore neighborhood (including diagonals),
+                   otherwise the Von Neumann neighborhood.
+            include_center: If True, include the position itself.
+            radius: radius, in cells, of neighborhood to get.
+
+        Returns:
+            An (N, k) integer array of cell indices (see pos_to_index), one
+            row per position, in the same order as get_neighborhood. On a
+            non-toroidal grid, cells that fall off the grid are -1. On a torus
+            narrower than the neighborhood, a row may repeat cells.
+
+        """
+        pos = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        dx, dy = self._get_bulk_offsets(pos, moore, include_center, radius)
+
+        xs = pos[:, 0, None] + dx
+        ys = pos[:, 1, None] + dy
+
+        if self.torus:
+            xs %= self.width
+            ys %= self.height
+            return xs * self.height + ys
+
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        return np.where(inside, xs * self.height + ys, -1)
+
+    def pos_to_index(
+        self, positions: Union[Sequence[Coordinate], np.ndarray]
+    ) -> np.ndarray:
+        """ Convert (x, y) positions to flat cell indices, x * height + y. """
+        pos = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        return pos[:, 0] * self.height + pos[:, 1]
+
+    def index_to_pos(self, indices: Union[Sequence[int], np.ndarray]) -> np.ndarray:
+        """ Convert flat cell indices back to an (N, 2) array of positions. """
+        xs, ys = np.divmod(np.asarray(indices, dtype=np.int64), self.height)
+        return np.stack([xs, ys], axis=-1)
 
     def iter_neighbors(
         self,
@@ -438,6 +1131,79 @@ class Grid:
         self.grid[x][y] = None
         self.empties.add(pos)
 
+    def place_agents(
+        self, agents: Iterable[Agent], positions: Iterable[Coordinate]
+    ) -> None:
+        """Position many agents on the grid at once, and set their pos
+        variables.
+
+        All positions are validated before the grid is touched, so a failed
+        call leaves the grid unchanged.
+
+        Args:
+            agents: Agents to place.
+            positions: One position per agent; positions must be distinct.
+
+        """
+        agents = list(agents)
+        positions = [self.torus_adj(pos) for pos in positions]
+        if len(agents) != len(positions):
+            raise ValueError("Expected one position per agent.")
+        if len(set(positions)) != len(positions):
+            raise Exception("Cannot place several agents in the same cell")
+
+        self._place_agents(positions, agents)
+        for agent, pos in zip(agents, positions):
+            agent.pos = pos
+
+    def _place_agents(self, positions: List[Coordinate], agents: List[Agent]) -> None:
+        """ Place the agents at the given, validated locations. """
+        for pos, agent in zip(positions, agents):
+            self._place_agent(pos, agent)
+
+    def remove_agents(self, agents: Iterable[Agent]) -> None:
+        """Remove many agents from the grid at once and set their pos
+        variables to None.
+
+        All agents are validated before the grid is touched, so a failed
+        call leaves the grid unchanged.
+
+        """
+        agents = list(agents)
+        if len({id(agent) for agent in agents}) != len(agents):
+            raise Exception("Cannot remove the same agent twice")
+        for agent in agents:
+            if agent.pos is None or self[agent.pos] is not agent:
+                raise Exception(
+                    "Agent {} is not on the grid".format(repr(agent.unique_id))
+                )
+
+        self._remove_agents([agent.pos for agent in agents], agents)
+        for agent in agents:
+            agent.pos = None
+
+    def _remove_agents(self, positions: List[Coordinate], agents: List[Agent]) -> None:
+        """ Remove the agents from the given locations. """
+        for pos, agent in zip(positions, agents):
+            self._remove_agent(pos, agent)
+
+    def random_empty_positions(
+        self, n: int, rng: Optional[random.Random] = None
+    ) -> List[Coordinate]:
+        """Draw n distinct empty cells, uniformly at random.
+
+        Args:
+            n: Number of cells to draw.
+            rng: Random number generator to draw with, usually model.random;
+                 defaults to the random module.
+
+        """
+        if n > len(self.empties):
+            raise Exception("ERROR: Not enough empty cells")
+        sample = random.sample if rng is None else rng.sample
+        empties = self.empties
+        return [empties[i] for i in sample(range(len(empties)), n)]
+
     def is_cell_empty(self, pos: Coordinate) -> bool:
         """ Returns a bool of the contents of a cell. """
         x, y = pos
@@ -448,47 +1214,490 @@ class Grid:
         pos = agent.pos
         if not self.empties:
             raise Exception("ERROR: No empty cells")
-        new_pos = agent.random.choice(self.empties)
+        new_pos = self._random_empty_cell(agent.random)
         self._place_agent(new_pos, agent)
         agent.pos = new_pos
         self._remove_agent(pos, agent)
 
+    def _random_empty_cell(self, rng: random.Random) -> Coordinate:
+        """ Draw one empty cell, uniformly at random. """
+        return rng.choice(self.empties)
+
     def exists_empty_cells(self) -> bool:
         """ Return True if any cells empty else False. """
-        return self.empties
+        return bool(self.empties)
+
+    def iter_occupied_cells(self) -> Iterator[Tuple[GridContent, int, int]]:
+        """ An iterator over the non-empty cells, as (contents, x, y). """
+        for cell, x, y in self.coord_iter():
+            if cell != self.default_val():
+                yield cell, x, y
+
+    def occupancy_mask(self) -> np.ndarray:
+        """Return a (width, height) boolean array which is True for every
+        occupied cell.
+
+        """
+        mask = np.zeros((self.width, self.height), dtype=bool)
+        for _, x, y in self.iter_occupied_cells():
+            mask[x, y] = True
+        return mask
+
+    def count_empty(self) -> int:
+        """ Return the number of empty cells. """
+        return len(self.empties)
+
+    def to_array(
+        self,
+        attribute: Union[str, Callable[[Agent], Any]],
+        mapping: Optional[Dict[Any, Any]] = None,
+        empty: Any = 0,
+        dtype: Any = np.float64,
+    ) -> np.ndarray:
+        """Export a value per cell as a (width, height) array, indexed [x, y]
+        like grid[x][y]. Transpose it to show y on the vertical axis.
+
+        Args:
+            attribute: Name of the agent attribute to export, or a function
+                       of the agent returning the value.
+            mapping: Optional dictionary translating the attribute values,
+                     e.g. {True: 100, False: 0}.
+            empty: Value of the empty cells.
+            dtype: dtype of the array.
+
+        """
+        array = np.full((self.width, self.height), empty, dtype=dtype)
+        cells = list(self.iter_occupied_cells())
+        if cells:
+            agents, xs, ys = zip(*cells)
+            array[list(xs), list(ys)] = self._agent_values(agents, attribute, mapping)
+        return array
+
+    @staticmethod
+    def _agent_values(
+        agents: Sequence[Agent],
+        attribute: Union[str, Callable[[Agent], Any]],
+        mapping: Optional[Dict[Any, Any]],
+    ) -> List[Any]:
+        """ Look up the exported value of every agent, see to_array. """
+        if isinstance(attribute, str):
+            attribute = operator.attrgetter(attribute)
+        values = list(map(attribute, agents))
+        if mapping is not None:
+            values = [mapping[value] for value in values]
+        return values
+
+    def add_property_layer(
+        self,
+        layer: Union[str, PropertyLayer],
+        default_value: Any = 0,
+        dtype: Any = np.float64,
+    ) -> PropertyLayer:
+        """Register a property layer on the grid.
+
+        Args:
+            layer: An existing PropertyLayer of the grid's size, or the name
+                   of a new layer to create.
+            default_value, dtype: Initial value and dtype of a new layer.
+
+        Returns:
+            The registered layer.
+
+        """
+        if isinstance(layer, str):
+            layer = PropertyLayer(
+                layer, self.width, self.height, default_value, dtype, self.torus
+            )
+        elif layer.data.shape != (self.width, self.height):
+            raise ValueError(
+                "Property layer {} does not match the grid size".format(layer.name)
+            )
+        if layer.name in self.properties:
+            raise Exception("Property layer {} already exists".format(layer.name))
+
+        self.properties[layer.name] = layer
+        return layer
+
+    def remove_property_layer(self, name: str) -> None:
+        """ Unregister the property layer with the given name. """
+        del self.properties[name]
+
+    def get_property_values(
+        self, name: str, positions: Union[Sequence[Coordinate], np.ndarray]
+    ) -> np.ndarray:
+        """Return the values of a property layer at many positions, e.g. at
+        the positions of a list of agents.
+
+        """
+        xs, ys = np.asarray(positions, dtype=np.int64).reshape(-1, 2).T
+        return self.properties[name].data[xs, ys]
+
+    def select_cells(
+        self, conditions: Optional[Dict[str, Any]] = None, only_empty: bool = False
+    ) -> List[Coordinate]:
+        """Return the cells for which all conditions hold.
+
+        Args:
+            conditions: Dictionary mapping property layer names to a mask or
+                        to a function of the layer data returning a mask.
+            only_empty: If True, only return empty cells.
+
+        """
+        mask = np.ones((self.width, self.height), dtype=bool)
+        for name, condition in (conditions or {}).items():
+            mask &= self.properties[name]._mask(condition)
+        if only_empty:
+            mask &= ~self.occupancy_mask()
+
+        xs, ys = np.nonzero(mask)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickle without the cached neighborhoods and the shared memory
+        handles; shared arrays are pickled as private copies.
+
+        """
+        state = self.__dict__.copy()
+        cache = self._neighborhood_cache
+        state["_neighborhood_cache"] = NeighborhoodCache(
+            cache.maxsize, cache.compact, cache.max_bytes
+        )
+        state["_shared_memory"] = dict()
+        return state
+
+    def _shareable_arrays(self) -> Dict[str, np.ndarray]:
+        """ The arrays share_memory moves to shared memory, by key. """
+        return {"layer:" + name: layer.data for name, layer in self.properties.items()}
+
+    def _set_shared_array(self, key: str, array: np.ndarray) -> None:
+        """ Replace the array stored under key by share_memory. """
+        self.properties[key[len("layer:") :]].data = array
+
+    def share_memory(self) -> Dict[str, Any]:
+        """Move the grid arrays into shared memory, so that other local
+        processes can read them without copies while the model keeps
+        stepping.
+
+        The occupancy of an array-backed SingleGrid and the data of the
+        property layers registered so far are moved. Readers see updates as
+        they happen, so a read in the middle of a step can mix old and new
+        values.
+
+        Returns:
+            A picklable manifest to pass to attach_shared_grid in the reading
+            processes.
+
+        """
+        if self._shared_memory:
+            raise Exception("Grid memory is already shared")
+
+        arrays = dict()
+        for key, array in self._shareable_arrays().items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            self._set_shared_array(key, shared)
+            self._shared_memory[key] = block
+            _owned_blocks.add(block.name)
+            arrays[key] = (block.name, array.shape, array.dtype.str)
+
+        return {
+            "width": self.width,
+            "height": self.height,
+            "torus": self.torus,
+            "arrays": arrays,
+        }
+
+    def release_shared_memory(self) -> None:
+        """Move the grid arrays back to private memory and free the shared
+        blocks. Attached readers keep their mapping until they close it.
+
+        """
+        arrays = self._shareable_arrays()
+        for key, block in self._shared_memory.items():
+            self._set_shared_array(key, np.array(arrays.pop(key)))
+            _owned_blocks.discard(block.name)
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                # Already unlinked, e.g. by a reader's resource tracker
+                pass
+            try:
+                block.close()
+            except BufferError:
+                # Someone still holds a view; the mapping goes with it.
+                pass
+        self._shared_memory.clear()
+
+    def window_sum(
+        self,
+        values: np.ndarray,
+        radius: int = 1,
+        moore: bool = True,
+        include_center: bool = True,
+    ) -> np.ndarray:
+        """Sum a per-cell value layer over the neighborhood of every cell at
+        once.
+
+        For example, with values being a 0/1 layer of cooperators, the result
+        holds for every cell the number of cooperators within radius. Moore
+        windows are computed from a summed-area table, Von Neumann windows
+        from row-wise prefix sums, so the cost does not depend on the number
+        of agents.
+
+        Args:
+            values: (width, height) array of per-cell values.
+            radius: radius, in cells, of the neighborhood to sum over.
+            moore: If True, sum over the Moore neighborhood (a square),
+                   otherwise over the Von Neumann neighborhood (a diamond).
+            include_center: If True, include the cell's own value.
+
+        Returns:
+            A (width, height) array of windowed sums. On a torus the window
+            wraps around the edges; otherwise cells off the grid count as 0.
+            On a torus narrower than the window, cells are counted once per
+            time the window covers them.
+
+        """
+        values = np.asarray(values)
+        if values.shape != (self.width, self.height):
+            raise ValueError(
+                "Expected a value layer of shape {}, got {}".format(
+                    (self.width, self.height), values.shape
+                )
+            )
+
+        sums = _window_sum(values, radius, moore, self.torus)
+        if not include_center:
+            sums -= values
+        return sums
+
+
+# SingleGrid methods bound per instance when array-backed
+_ARRAY_METHODS = (
+    "is_cell_empty",
+    "iter_cell_list_contents",
+    "iter_neighbors",
+    "get_neighbors",
+)
 
 
 class SingleGrid(Grid):
-    """ Grid where each cell contains exactly at most one object. """
+    """Grid where each cell contains exactly at most one object.
 
-    empties: Set[Coordinate] = set()
+    With array_backed=True the cell contents are kept in a preallocated
+    int32 array of agent slots instead of a list-of-lists: slot 0 means
+    empty, any other value indexes into the agent slot table. The regular
+    grid API is kept on top of it, while occupancy masks, empty counts and
+    region slices become single array operations.
 
-    def __init__(self, width: int, height: int, torus: bool) -> None:
+    With track_neighbors=True the grid also keeps, for every cell, the
+    number of occupied cells in its Moore neighborhood, updated on each
+    place, move and remove. empty_neighbors and has_empty_neighbor use it to
+    rule out fully surrounded cells without looking at their neighbors.
+
+    """
+
+    empties: EmptyCells
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        array_backed: bool = False,
+        track_neighbors: bool = False,
+    ) -> None:
         """Create a new single-item grid.
 
         Args:
             width, height: The width and width of the grid
             torus: Boolean whether the grid wraps or not.
+            array_backed: Store the cells in an int32 slot array.
+            track_neighbors: Maintain a per-cell count of occupied Moore
+                             neighbors, used by empty_neighbors and
+                             has_empty_neighbor.
 
         """
+        self.array_backed = array_backed
+        self.track_neighbors = False
+        self._bind_array_methods()
         super().__init__(width, height, torus)
 
-    def position_agent(
-        self, agent: Agent, x: Union[int, str] = "random", y: Union[int, str] = "random"
-    ) -> None:
-        """Position an agent on the grid.
-        This is used when first placing agents! Use 'move_to_empty()'
-        when you want agents to jump to an empty cell.
-        Use 'swap_pos()' to swap agents positions.
-        If x or y are positive, they are used, but if "random",
-        we get a random position.
-        Ensure this random position is not occupied (in Grid).
+        if track_neighbors:
+            self._init_neighbor_counts()
+            self.track_neighbors = True
+
+    def _bind_array_methods(self) -> None:
+        """Bind the array-backed lookups over the list-of-lists ones once,
+        so that lookups do not branch on the mode.
 
         """
-        if x == "random" or y == "random":
-            if not self.empties:
-                raise Exception("ERROR: Grid full")
-            coords = agent.random.choice(self.empties)
+        if not self.array_backed:
+            return
+        self.is_cell_empty = self._is_cell_empty_array  # type: ignore
+        self.iter_cell_list_contents = (  # type: ignore
+            self._iter_cell_list_contents_array
+        )
+        self.iter_neighbors = self._iter_neighbors_array  # type: ignore
+        self.get_neighbors = self._get_neighbors_array  # type: ignore
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        for name in _ARRAY_METHODS:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._bind_array_methods()
+
+    def _init_cells(self) -> None:
+        if not self.array_backed:
+            super()._init_cells()
+            return
+
+        # Slot 0 is reserved for the empty cell, so that looking a cell up
+        # never needs a branch.
+        self._occupancy = np.zeros((self.width, self.height), dtype=np.int32)
+        self._slot_agents: List[Optional[Agent]] = [None]
+        self._free_slots: List[int] = []
+        self.grid = _SlotColumns(self._occupancy, self._slot_agents)
+
+    def _shareable_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = super()._shareable_arrays()
+        if self.array_backed:
+            arrays["occupancy"] = self._occupancy
+        return arrays
+
+    def _set_shared_array(self, key: str, array: np.ndarray) -> None:
+        if key != "occupancy":
+            super()._set_shared_array(key, array)
+            return
+        self._occupancy = array
+        self.grid = _SlotColumns(self._occupancy, self._slot_agents)
+
+    def __getitem__(self, index: Any) -> Any:
+        if not self.array_backed or isinstance(index, int):
+            return super().__getitem__(index)
+
+        if isinstance(index[0], tuple):
+            return super().__getitem__(index)
+
+        x, y = index
+        if isinstance(x, int) and isinstance(y, int):
+            x, y = self.torus_adj((x, y))
+            return self._slot_agents[self._occupancy.item(x, y)]
+
+        if isinstance(x, int):
+            x, _ = self.torus_adj((x, 0))
+            x = slice(x, x + 1)
+
+        if isinstance(y, int):
+            _, y = self.torus_adj((0, y))
+            y = slice(y, y + 1)
+
+        agents = self._slot_agents
+        return [agents[slot] for slot in self._occupancy[x, y].ravel().tolist()]
+
+    def coord_iter(self) -> Iterator[Tuple[GridContent, int, int]]:
+        if not self.array_backed:
+            yield from super().coord_iter()
+            return
+
+        agents = self._slot_agents
+        for x, col in enumerate(self._occupancy.tolist()):
+            for y, slot in enumerate(col):
+                yield agents[slot], x, y
+
+    def iter_occupied_cells(self) -> Iterator[Tuple[GridContent, int, int]]:
+        if not self.array_backed:
+            yield from super().iter_occupied_cells()
+            return
+
+        agents = self._slot_agents
+        xs, ys = np.nonzero(self._occupancy)
+        slots = self._occupancy[xs, ys]
+        for slot, x, y in zip(slots.tolist(), xs.tolist(), ys.tolist()):
+            yield agents[slot], x, y
+
+    @accept_tuple_argument
+    def _iter_cell_list_contents_array(
+        self, cell_list: Iterable[Coordinate]
+    ) -> Iterator[GridContent]:
+        agents = self._slot_agents
+        slot = self._occupancy.item
+        return filter(None, (agents[slot(x, y)] for x, y in cell_list))
+
+    def _get_neighbors_array(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> List[GridContent]:
+        # One take of the slots of the whole neighborhood
+        cells = self._get_neighborhood_cells(pos, moore, include_center, radius)
+        agents = self._slot_agents
+        return [agents[slot] for slot in self._occupancy.take(cells).tolist() if slot]
+
+    def _iter_neighbors_array(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> Iterator[GridContent]:
+        return iter(self._get_neighbors_array(pos, moore, include_center, radius))
+
+    def occupancy_mask(self) -> np.ndarray:
+        if not self.array_backed:
+            return super().occupancy_mask()
+        return self._occupancy != 0
+
+    def to_array(
+        self,
+        attribute: Union[str, Callable[[Agent], Any]],
+        mapping: Optional[Dict[Any, Any]] = None,
+        empty: Any = 0,
+        dtype: Any = np.float64,
+    ) -> np.ndarray:
+        if not self.array_backed:
+            return super().to_array(attribute, mapping, empty, dtype)
+
+        # One value per slot, then a single gather through the slot array
+        live = [i for i, agent in enumerate(self._slot_agents) if agent is not None]
+        table = np.full(len(self._slot_agents), empty, dtype=dtype)
+        table[live] = self._agent_values(
+            [self._slot_agents[i] for i in live], attribute, mapping
+        )
+        return table[self._occupancy]
+
+    def count_empty(self) -> int:
+        if not self.array_backed:
+            return super().count_empty()
+        return self._occupancy.size - int(np.count_nonzero(self._occupancy))
+
+    def _is_cell_empty_array(self, pos: Coordinate) -> bool:
+        x, y = pos
+        return self._occupancy.item(x, y) == 0
+
+    def position_agent(
+        self, agent: Agent, x: Union[int, str] = "random", y: Union[int, str] = "random"
+    ) -> None:
+        """Position an agent on the grid.
+        This is used when first placing agents! Use 'move_to_empty()'
+        when you want agents to jump to an empty cell.
+        Use 'swap_pos()' to swap agents positions.
+        If x or y are positive, they are used, but if "random",
+        we get a random position.
+        Ensure this random position is not occupied (in Grid).
+
+        """
+        if x == "random" or y == "random":
+            if not self.empties:
+                raise Exception("ERROR: Grid full")
+            coords = self._random_empty_cell(agent.random)
         else:
             coords = (x, y)
 
@@ -496,7 +1705,1180 @@ class SingleGrid(Grid):
         self._place_agent(coords, agent)
 
     def _place_agent(self, pos: Coordinate, agent: Agent) -> None:
-        if self.is_cell_empty(pos):
+        if not self.is_cell_empty(pos):
+            raise Exception("Cell not empty")
+
+        if self.array_backed:
+            x, y = pos
+            self._occupancy[x, y] = self._allocate_slot(agent)
+            self.empties.discard(pos)
+        else:
             super()._place_agent(pos, agent)
+
+        if self.track_neighbors:
+            self._count_neighbors(pos, 1)
+
+    def _allocate_slot(self, agent: Agent) -> int:
+        """ Store the agent in a free slot of the slot table. """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_agents[slot] = agent
         else:
+            slot = len(self._slot_agents)
+            self._slot_agents.append(agent)
+        return slot
+
+    def _place_agents(self, positions: List[Coordinate], agents: List[Agent]) -> None:
+        if self.array_backed:
+            xs, ys = np.array(positions, dtype=np.int64).reshape(-1, 2).T
+            if self._occupancy[xs, ys].any():
+                raise Exception("Cell not empty")
+
+            slots = [self._allocate_slot(agent) for agent in agents]
+            self._occupancy[xs, ys] = slots
+            for pos in positions:
+                self.empties.discard(pos)
+        else:
+            for pos in positions:
+                if not self.is_cell_empty(pos):
+                    raise Exception("Cell not empty")
+            for pos, agent in zip(positions, agents):
+                Grid._place_agent(self, pos, agent)
+
+        if self.track_neighbors:
+            for pos in positions:
+                self._count_neighbors(pos, 1)
+
+    def _remove_agents(self, positions: List[Coordinate], agents: List[Agent]) -> None:
+        if not self.array_backed:
+            super()._remove_agents(positions, agents)
+            return
+
+        xs, ys = np.array(positions, dtype=np.int64).reshape(-1, 2).T
+        slots = self._occupancy[xs, ys].tolist()
+        self._occupancy[xs, ys] = 0
+        for slot, pos in zip(slots, positions):
+            if slot:
+                self._slot_agents[slot] = None
+                self._free_slots.append(slot)
+                if self.track_neighbors:
+                    self._count_neighbors(pos, -1)
+            self.empties.add(pos)
+
+    def _remove_agent(self, pos: Coordinate, agent: Agent) -> None:
+        if self.track_neighbors and not self.is_cell_empty(pos):
+            self._count_neighbors(pos, -1)
+
+        if not self.array_backed:
+            super()._remove_agent(pos, agent)
+            return
+
+        x, y = pos
+        slot = self._occupancy.item(x, y)
+        self._occupancy[x, y] = 0
+        if slot:
+            self._slot_agents[slot] = None
+            self._free_slots.append(slot)
+        self.empties.add(pos)
+
+    def _init_neighbor_counts(self) -> None:
+        """Set up the per-cell count of occupied Moore neighbors, and the
+        number of Moore neighbors each cell has.
+
+        """
+        self._neighbor_counts = np.zeros((self.width, self.height), dtype=np.int16)
+
+        if self.torus:
+            size = len(self.get_neighborhood((0, 0), moore=True))
+            self._neighborhood_sizes = np.full(
+                (self.width, self.height), size, dtype=np.int16
+            )
+        else:
+            ones = np.ones((self.width, self.height), dtype=np.int16)
+            self._neighborhood_sizes = self.window_sum(
+                ones, 1, moore=True, include_center=False
+            ).astype(np.int16)
+
+        for _, x, y in self.iter_occupied_cells():
+            self._count_neighbors((x, y), 1)
+
+    def _count_neighbors(self, pos: Coordinate, delta: int) -> None:
+        """ Add delta to the occupied-neighbor count of the cells around pos. """
+        counts = self._neighbor_counts
+        for cell in self.get_neighborhood(pos, moore=True):
+            counts[cell] += delta
+
+    def has_empty_neighbor(self, pos: Coordinate) -> bool:
+        """Return True if any cell of the Moore neighborhood of pos is empty.
+
+        With track_neighbors this is a single lookup.
+
+        """
+        if not self.track_neighbors:
+            return any(
+                self.is_cell_empty(cell)
+                for cell in self.get_neighborhood(pos, moore=True)
+            )
+        x, y = pos
+        return self._neighbor_counts.item(x, y) < self._neighborhood_sizes.item(x, y)
+
+    def empty_neighbors(self, pos: Coordinate) -> List[Coordinate]:
+        """Return the empty cells of the Moore neighborhood of pos.
+
+        With track_neighbors, a fully surrounded cell is answered without
+        scanning its neighborhood.
+
+        """
+        if self.track_neighbors and not self.has_empty_neighbor(pos):
+            return []
+        return [
+            cell
+            for cell in self.get_neighborhood(pos, moore=True)
+            if self.is_cell_empty(cell)
+        ]
+
+
+class SparseGrid(SingleGrid):
+    """Single-item grid for very large, sparsely populated worlds.
+
+    Cells are allocated in chunk_size x chunk_size chunks, only when an
+    agent first lands in one, and empty cells are tracked implicitly through
+    per-chunk agent counts. Memory use is therefore proportional to the area
+    the agents have visited rather than to width * height; the small default
+    chunks keep it close to a chunk per agent when agents are spread out,
+    larger ones suit dense clusters. Empty cells are drawn by rejection
+    sampling, which is fast as long as the grid is mostly empty.
+
+    """
+
+    # Random draws tried before falling back to listing the empty cells.
+    max_rejections = 64
+
+    def __init__(
+        self, width: int, height: int, torus: bool, chunk_size: int = 8
+    ) -> None:
+        """Create a new sparse grid.
+
+        Args:
+            width, height: The width and height of the grid
+            torus: Boolean whether the grid wraps or not.
+            chunk_size: Side length, in cells, of the allocated chunks.
+
+        """
+        self.chunk_size = chunk_size
+        super().__init__(width, height, torus)
+
+    def _init_cells(self) -> None:
+        self._chunks: Dict[Tuple[int, int], List[Optional[Agent]]] = dict()
+        self._chunk_counts: Dict[Tuple[int, int], int] = dict()
+        self._agent_count = 0
+        self.grid = _SparseColumns(self)
+
+    def _init_empties(self) -> None:
+        self.empties = _SparseEmpties(self)
+
+    def _get_cell(self, x: int, y: int) -> Optional[Agent]:
+        size = self.chunk_size
+        chunk = self._chunks.get((x // size, y // size), None)
+        if chunk is None:
+            return None
+        return chunk[(x % size) * size + y % size]
+
+    def is_cell_empty(self, pos: Coordinate) -> bool:
+        x, y = pos
+        return self._get_cell(x, y) is None
+
+    @accept_tuple_argument
+    def iter_cell_list_contents(
+        self, cell_list: Iterable[Coordinate]
+    ) -> Iterator[GridContent]:
+        get_cell = self._get_cell
+        return filter(None, (get_cell(x, y) for x, y in cell_list))
+
+    def iter_occupied_cells(self) -> Iterator[Tuple[GridContent, int, int]]:
+        size = self.chunk_size
+        for (cx, cy), chunk in self._chunks.items():
+            if not self._chunk_counts[cx, cy]:
+                continue
+            for i, agent in enumerate(chunk):
+                if agent is not None:
+                    dx, dy = divmod(i, size)
+                    yield agent, cx * size + dx, cy * size + dy
+
+    def count_empty(self) -> int:
+        return len(self.empties)
+
+    def _place_agent(self, pos: Coordinate, agent: Agent) -> None:
+        x, y = pos
+        size = self.chunk_size
+        key = (x // size, y // size)
+        chunk = self._chunks.get(key, None)
+        if chunk is None:
+            chunk = self._chunks[key] = [None] * (size * size)
+            self._chunk_counts[key] = 0
+
+        i = (x % size) * size + y % size
+        if chunk[i] is not None:
             raise Exception("Cell not empty")
+        chunk[i] = agent
+        self._chunk_counts[key] += 1
+        self._agent_count += 1
+
+    def _place_agents(self, positions: List[Coordinate], agents: List[Agent]) -> None:
+        for pos in positions:
+            if not self.is_cell_empty(pos):
+                raise Exception("Cell not empty")
+        for pos, agent in zip(positions, agents):
+            self._place_agent(pos, agent)
+
+    def _remove_agent(self, pos: Coordinate, agent: Agent) -> None:
+        x, y = pos
+        size = self.chunk_size
+        key = (x // size, y // size)
+        chunk = self._chunks.get(key, None)
+        i = (x % size) * size + y % size
+        if chunk is None or chunk[i] is None:
+            return
+        chunk[i] = None
+        self._chunk_counts[key] -= 1
+        self._agent_count -= 1
+
+    def _random_empty_cell(self, rng: random.Random) -> Coordinate:
+        for _ in range(self.max_rejections):
+            pos = (rng.randrange(self.width), rng.randrange(self.height))
+            if self.is_cell_empty(pos):
+                return pos
+        return rng.choice(self.empties)
+
+    def random_empty_positions(
+        self, n: int, rng: Optional[random.Random] = None
+    ) -> List[Coordinate]:
+        if n > len(self.empties):
+            raise Exception("ERROR: Not enough empty cells")
+        if rng is None:
+            rng = cast(random.Random, random)
+
+        positions: Dict[Coordinate, None] = dict()
+        attempts = 0
+        while len(positions) < n and attempts < self.max_rejections * n:
+            pos = (rng.randrange(self.width), rng.randrange(self.height))
+            if self.is_cell_empty(pos):
+                positions[pos] = None
+            attempts += 1
+
+        if len(positions) == n:
+            return list(positions)
+        return rng.sample(list(self.empties), n)
+
+
+class HexGrid(SingleGrid):
+    """Single-item grid with hexagonal cells.
+
+    Cells use the same offset layout as CanvasHexGrid (HexDraw.js): cells
+    are arranged in columns, and odd columns are shifted half a cell
+    towards higher y. Every cell has six neighbors; the moore argument of
+    the neighborhood methods is accepted for compatibility and ignored.
+
+    The offsets of each neighborhood are precomputed once per column parity
+    and radius, so hexagonal neighborhoods, their cache and the bulk
+    get_neighborhoods API cost the same as square ones. On a torus the
+    width must be even, or the column parity would break at the seam.
+
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        array_backed: bool = False,
+        track_neighbors: bool = False,
+    ) -> None:
+        """Create a new hexagonal grid.
+
+        Args:
+            width, height: The width and height of the grid
+            torus: Boolean whether the grid wraps or not.
+            array_backed: Store the cells in an int32 slot array.
+            track_neighbors: Maintain a per-cell count of occupied
+                             neighbors, see SingleGrid.
+
+        """
+        if torus and width % 2:
+            raise ValueError("A toroidal HexGrid needs an even width.")
+        super().__init__(width, height, torus, array_backed, track_neighbors)
+
+    def _get_hex_stencil(
+        self, parity: int, include_center: bool, radius: int
+    ) -> Tuple[np.ndarray, List[Coordinate]]:
+        """Return the (dx, dy) offsets of the hexagonal neighborhood of a
+        cell in an even (parity 0) or odd (parity 1) column.
+
+        """
+        key = ("hex", parity, include_center, radius)
+        stencil = self._stencils.get(key, None)
+
+        if stencil is None:
+            # Offset coordinates to axial ones: q = x, r = y - (x - x % 2) / 2
+            center_r = -((parity - (parity & 1)) // 2)
+            offsets = []
+            for dy in range(-radius - 1, radius + 2):
+                for dx in range(-radius, radius + 1):
+                    x = parity + dx
+                    dq, dr = dx, dy - (x - (x & 1)) // 2 - center_r
+                    distance = (abs(dq) + abs(dr) + abs(dq + dr)) // 2
+                    if distance > radius or (distance == 0 and not include_center):
+                        continue
+                    offsets.append((dx, dy))
+
+            stencil = (np.array(offsets, dtype=np.int64).reshape(-1, 2), offsets)
+            self._stencils[key] = stencil
+
+        return stencil
+
+    def _get_pos_stencil(
+        self, pos: Coordinate, moore: bool, include_center: bool, radius: int
+    ) -> Tuple[np.ndarray, List[Coordinate]]:
+        return self._get_hex_stencil(pos[0] % 2, include_center, radius)
+
+    def _get_bulk_offsets(
+        self, pos: np.ndarray, moore: bool, include_center: bool, radius: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        even, _ = self._get_hex_stencil(0, include_center, radius)
+        odd, _ = self._get_hex_stencil(1, include_center, radius)
+        offsets = np.stack([even, odd])[pos[:, 0] % 2]
+        return offsets[:, :, 0], offsets[:, :, 1]
+
+    def get_neighborhood(
+        self,
+        pos: Coordinate,
+        moore: bool = True,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> List[Coordinate]:
+        """Return a list of cells that are in the hexagonal neighborhood of
+        a certain point.
+
+        Args:
+            pos: Coordinate tuple for the neighborhood to get.
+            moore: Ignored; kept for compatibility with Grid.
+            include_center: If True, return the (x, y) cell as well.
+                            Otherwise, return surrounding cells only.
+            radius: radius, in cells, of neighborhood to get.
+
+        Returns:
+            A list of coordinate tuples representing the neighborhood; with
+            radius r, at most 3 * r * (r + 1) cells, plus the center.
+
+        """
+        return super().get_neighborhood(pos, True, include_center, radius)
+
+    def window_sum(
+        self,
+        values: np.ndarray,
+        radius: int = 1,
+        moore: bool = True,
+        include_center: bool = True,
+    ) -> np.ndarray:
+        """Sum a per-cell value layer over the hexagonal neighborhood of
+        every cell at once; see Grid.window_sum. moore is ignored.
+
+        """
+        values = np.asarray(values)
+        if values.shape != (self.width, self.height):
+            raise ValueError(
+                "Expected a value layer of shape {}, got {}".format(
+                    (self.width, self.height), values.shape
+                )
+            )
+
+        r = radius + 1
+        padded = np.pad(values, r, mode="wrap" if self.torus else "constant")
+        w, h = self.width, self.height
+        sums = np.zeros((w, h), dtype=np.result_type(values.dtype, np.int64))
+
+        for parity in (0, 1):
+            offsets, _ = self._get_hex_stencil(parity, include_center, radius)
+            for dx, dy in offsets.tolist():
+                sums[parity::2] += padded[
+                    r + dx + parity : r + dx + w : 2, r + dy : r + dy + h
+                ]
+        return sums
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """Return the sorted unique values of an integer array; a plain sort
+    is much faster than np.unique on large arrays of int64 keys.
+
+    """
+    values = np.sort(values)
+    keep = np.empty(len(values), dtype=bool)
+    keep[:1] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def _gather_neighbors(
+    indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate the CSR neighbor slices of many nodes.
+
+    Returns:
+        The neighbors, and for each of them the position in nodes of the
+        node it is a neighbor of.
+
+    """
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    owners = np.repeat(np.arange(len(nodes)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indices[starts[owners] + offsets], owners
+
+
+class NetworkGrid:
+    """Network space where agents live on the nodes of a graph.
+
+    The graph is stored in compressed sparse row (CSR) form: the neighbors
+    of node i are indices[indptr[i]:indptr[i + 1]], so a neighbor lookup is
+    an O(degree) array slice and no Python objects are kept per edge. Nodes
+    are numbered 0 to num_nodes - 1 and an agent's pos is its node number.
+    A node can hold several agents.
+
+    Methods mirror Grid: get_neighborhood returns node numbers,
+    get_neighbors returns the agents on them, and get_neighborhoods answers
+    k-hop queries for many nodes at once.
+
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray) -> None:
+        """Create a new network space from CSR arrays.
+
+        Args:
+            indptr: (num_nodes + 1,) array of offsets into indices.
+            indices: Neighbor node numbers, grouped by node.
+
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices)
+        self.num_nodes = len(self.indptr) - 1
+        self._contents: List[Optional[List[Agent]]] = [None] * self.num_nodes
+
+    @classmethod
+    def from_edges(
+        cls,
+        num_nodes: int,
+        edges: Union[np.ndarray, Sequence[Tuple[int, int]]],
+        directed: bool = False,
+    ) -> "NetworkGrid":
+        """Create a network space from an edge list.
+
+        Args:
+            num_nodes: Number of nodes.
+            edges: (E, 2) array or sequence of (source, target) pairs.
+            directed: If False, every edge is stored in both directions.
+
+        Self-loops and duplicate edges are dropped; each node's neighbors
+        are sorted.
+
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        sources, targets = edges[:, 0], edges[:, 1]
+        if not directed:
+            sources, targets = (
+                np.concatenate([sources, targets]),
+                np.concatenate([targets, sources]),
+            )
+
+        keys = _sorted_unique(
+            sources[sources != targets] * num_nodes + targets[sources != targets]
+        )
+        sources, targets = np.divmod(keys, num_nodes)
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        dtype = np.int32 if num_nodes < 2 ** 31 else np.int64
+        return cls(indptr, targets.astype(dtype))
+
+    @classmethod
+    def from_networkx(cls, G: Any) -> "NetworkGrid":
+        """Create a network space from a networkx graph whose nodes are
+        numbered 0 to len(G) - 1.
+
+        """
+        edges = np.array(list(G.edges()), dtype=np.int64).reshape(-1, 2)
+        return cls.from_edges(G.number_of_nodes(), edges, directed=G.is_directed())
+
+    @classmethod
+    def small_world(
+        cls, num_nodes: int, k: int, p: float, seed: Any = None
+    ) -> "NetworkGrid":
+        """Create a Watts-Strogatz small-world network, built with array
+        operations so that millions of nodes take seconds.
+
+        Args:
+            num_nodes: Number of nodes, arranged in a ring.
+            k: Each node is joined to its k nearest ring neighbors.
+            p: Probability of rewiring each edge to a random target.
+            seed: Seed or numpy.random.Generator for the rewiring.
+
+        Rewired edges that would duplicate an existing edge or form a
+        self-loop are dropped, so the mean degree can be slightly below k.
+
+        """
+        rng = np.random.default_rng(seed)
+        nodes = np.arange(num_nodes, dtype=np.int64)
+        sources = np.repeat(nodes, k // 2)
+        targets = (sources + np.tile(np.arange(1, k // 2 + 1), num_nodes)) % num_nodes
+
+        rewire = rng.random(len(targets)) < p
+        targets[rewire] = rng.integers(0, num_nodes, int(rewire.sum()))
+        return cls.from_edges(num_nodes, np.stack([sources, targets], axis=1))
+
+    def to_networkx(self) -> Any:
+        """ Return the graph as a networkx DiGraph, e.g. for NetworkModule. """
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_nodes_from(range(self.num_nodes))
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        G.add_edges_from(zip(sources.tolist(), self.indices.tolist()))
+        return G
+
+    def degree(self, node_id: int) -> int:
+        """ Return the number of neighbors of a node. """
+        return int(self.indptr[node_id + 1] - self.indptr[node_id])
+
+    def place_agent(self, agent: Agent, node_id: int) -> None:
+        """ Place an agent on a node, and set its pos variable. """
+        agents = self._contents[node_id]
+        if agents is None:
+            self._contents[node_id] = [agent]
+        else:
+            agents.append(agent)
+        agent.pos = node_id
+
+    def remove_agent(self, agent: Agent) -> None:
+        """ Remove the agent from the network and set its pos variable to None. """
+        agents = self._contents[agent.pos]
+        agents.remove(agent)
+        if not agents:
+            self._contents[agent.pos] = None
+        agent.pos = None
+
+    def move_agent(self, agent: Agent, node_id: int) -> None:
+        """ Move an agent from its current node to a new one. """
+        self.remove_agent(agent)
+        self.place_agent(agent, node_id)
+
+    def is_cell_empty(self, node_id: int) -> bool:
+        """ Returns a bool of the contents of a node. """
+        return self._contents[node_id] is None
+
+    def get_neighborhood(
+        self, node_id: int, include_center: bool = False, radius: int = 1
+    ) -> List[int]:
+        """Return the nodes within radius hops of a node.
+
+        Args:
+            node_id: Node to get the neighborhood of.
+            include_center: If True, include the node itself.
+            radius: Maximal number of hops.
+
+        Returns:
+            A list of node numbers; for radius 1 in adjacency order,
+            otherwise sorted.
+
+        """
+        if radius == 1:
+            neighborhood = self.indices[self.indptr[node_id] : self.indptr[node_id + 1]]
+            if include_center:
+                return [node_id] + neighborhood.tolist()
+            return neighborhood.tolist()
+
+        _, nodes = self.get_neighborhoods([node_id], include_center, radius)
+        return nodes.tolist()
+
+    def get_neighborhoods(
+        self,
+        node_ids: Union[Sequence[int], np.ndarray],
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the radius-hop neighborhoods of many nodes at once.
+
+        The search runs as one breadth-first search over (query, node)
+        pairs, so the work is vectorized across all queries. The pairs
+        reached so far are kept sorted, so that each hop only sorts its new
+        frontier and merges it in.
+
+        Returns:
+            The neighborhoods in CSR form, (indptr, indices): the
+            neighborhood of node_ids[i] is indices[indptr[i]:indptr[i + 1]],
+            sorted.
+
+        """
+        sources = np.asarray(node_ids, dtype=np.int64).ravel()
+        n = self.num_nodes
+
+        # Pairs are encoded as query * num_nodes + node, sorted by query.
+        reached = np.arange(len(sources), dtype=np.int64) * n + sources
+        frontier = reached
+        for _ in range(radius):
+            if not len(frontier):
+                break
+            queries, nodes = np.divmod(frontier, n)
+            neighbors, owners = _gather_neighbors(self.indptr, self.indices, nodes)
+            frontier = _sorted_unique(queries[owners] * n + neighbors)
+            # Drop the pairs reached at earlier hops
+            found = np.searchsorted(reached, frontier)
+            found[found == len(reached)] = 0
+            frontier = frontier[reached[found] != frontier]
+            # Both are sorted, which the stable sort merges in linear time
+            reached = np.sort(np.concatenate([reached, frontier]), kind="stable")
+
+        queries, nodes = np.divmod(reached, n)
+        if not include_center:
+            keep = nodes != sources[queries]
+            queries, nodes = queries[keep], nodes[keep]
+
+        indptr = np.zeros(len(sources) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(queries, minlength=len(sources)), out=indptr[1:])
+        return indptr, nodes
+
+    def iter_neighbors(
+        self, node_id: int, include_center: bool = False, radius: int = 1
+    ) -> Iterator[Agent]:
+        """ Return an iterator over the agents within radius hops of a node. """
+        neighborhood = self.get_neighborhood(node_id, include_center, radius)
+        return self.iter_cell_list_contents(neighborhood)
+
+    def get_neighbors(
+        self, node_id: int, include_center: bool = False, radius: int = 1
+    ) -> List[Agent]:
+        """ Return a list of the agents within radius hops of a node. """
+        return list(self.iter_neighbors(node_id, include_center, radius))
+
+    def iter_cell_list_contents(self, cell_list: Iterable[int]) -> Iterator[Agent]:
+        """ Return an iterator of the agents on the given nodes. """
+        contents = self._contents
+        return itertools.chain.from_iterable(
+            filter(None, (contents[node_id] for node_id in cell_list))
+        )
+
+    def get_cell_list_contents(self, cell_list: Iterable[int]) -> List[Agent]:
+        """ Return a list of the agents on the given nodes. """
+        return list(self.iter_cell_list_contents(cell_list))
+
+    def get_all_cell_contents(self) -> List[Agent]:
+        """ Return a list of all agents in the network. """
+        return self.get_cell_list_contents(range(self.num_nodes))
+
+    def occupancy_mask(self) -> np.ndarray:
+        """ Return a (num_nodes,) boolean array which is True for occupied nodes. """
+        return np.fromiter(
+            (agents is not None for agents in self._contents),
+            dtype=bool,
+            count=self.num_nodes,
+        )
+
+
+class ContinuousSpace:
+    """Continuous two-dimensional space, optionally toroidal.
+
+    Agents are indexed in a uniform cell list: the space is cut into square
+    cells of side cell_size, and each cell keeps the agents inside it. A
+    move only touches the old and new cells, and a radius query only looks
+    at the cells overlapping the query circle, so its cost follows the
+    number of nearby agents rather than the total. Choose cell_size close
+    to the usual query radius.
+
+    Positions are also kept in a dense array, which get_pairs_within uses
+    to find all close pairs with array operations.
+
+    """
+
+    def __init__(
+        self,
+        x_max: float,
+        y_max: float,
+        torus: bool,
+        x_min: float = 0,
+        y_min: float = 0,
+        cell_size: float = 1.0,
+    ) -> None:
+        """Create a new continuous space.
+
+        Args:
+            x_max, y_max: Maximal x and y coordinates.
+            torus: Boolean whether the space wraps or not.
+            x_min, y_min: Minimal x and y coordinates; default 0.
+            cell_size: Side length of the cells of the spatial index.
+
+        """
+        self.x_min = x_min
+        self.x_max = x_max
+        self.width = x_max - x_min
+        self.y_min = y_min
+        self.y_max = y_max
+        self.height = y_max - y_min
+        self.center = np.array(((x_max + x_min) / 2, (y_max + y_min) / 2))
+        self.size = np.array((self.width, self.height))
+        self.torus = torus
+
+        # Cells are shrunk so that they tile the space exactly, which keeps
+        # the cell index wrap-around in line with the toroidal geometry.
+        self.cell_size = cell_size
+        self._cells_x = max(1, math.ceil(self.width / cell_size))
+        self._cells_y = max(1, math.ceil(self.height / cell_size))
+        self._cell_w = self.width / self._cells_x
+        self._cell_h = self.height / self._cells_y
+        self._cells: Dict[Tuple[int, int], Dict[Agent, None]] = dict()
+        self._agent_cells: Dict[Agent, Tuple[int, int]] = dict()
+
+        # Dense position array; _agent_rows maps each agent to its row.
+        self._positions = np.zeros((16, 2), dtype=np.float64)
+        self._agent_list: List[Agent] = []
+        self._agent_rows: Dict[Agent, int] = dict()
+
+    @property
+    def agents(self) -> List[Agent]:
+        """ The agents in the space, in the row order of get_pairs_within. """
+        return list(self._agent_list)
+
+    def _cell_of(self, pos: FloatCoordinate) -> Tuple[int, int]:
+        cx = int((pos[0] - self.x_min) // self._cell_w)
+        cy = int((pos[1] - self.y_min) // self._cell_h)
+        return min(cx, self._cells_x - 1), min(cy, self._cells_y - 1)
+
+    def place_agent(self, agent: Agent, pos: FloatCoordinate) -> None:
+        """ Place a new agent in the space, and set its pos variable. """
+        pos = self.torus_adj(pos)
+        row = len(self._agent_list)
+        if row == len(self._positions):
+            self._positions = np.concatenate(
+                [self._positions, np.zeros_like(self._positions)]
+            )
+        self._positions[row] = pos
+        self._agent_list.append(agent)
+        self._agent_rows[agent] = row
+
+        cell = self._cell_of(pos)
+        self._cells.setdefault(cell, dict())[agent] = None
+        self._agent_cells[agent] = cell
+        agent.pos = pos
+
+    def move_agent(self, agent: Agent, pos: FloatCoordinate) -> None:
+        """ Move an agent from its current position to a new position. """
+        pos = self.torus_adj(pos)
+        self._positions[self._agent_rows[agent]] = pos
+
+        cell = self._cell_of(pos)
+        old_cell = self._agent_cells[agent]
+        if cell != old_cell:
+            self._remove_from_cell(agent, old_cell)
+            self._cells.setdefault(cell, dict())[agent] = None
+            self._agent_cells[agent] = cell
+        agent.pos = pos
+
+    def remove_agent(self, agent: Agent) -> None:
+        """ Remove an agent from the space and set its pos variable to None. """
+        self._remove_from_cell(agent, self._agent_cells.pop(agent))
+
+        # Swap-remove from the dense position array.
+        row = self._agent_rows.pop(agent)
+        last = self._agent_list.pop()
+        if last is not agent:
+            self._agent_list[row] = last
+            self._agent_rows[last] = row
+            self._positions[row] = self._positions[len(self._agent_list)]
+        agent.pos = None
+
+    def _remove_from_cell(self, agent: Agent, cell: Tuple[int, int]) -> None:
+        agents = self._cells[cell]
+        del agents[agent]
+        if not agents:
+            del self._cells[cell]
+
+    def get_neighbors(
+        self, pos: FloatCoordinate, radius: float, include_center: bool = True
+    ) -> List[Agent]:
+        """Return all agents within a distance of a point.
+
+        Args:
+            pos: (x, y) coordinate of the center of the search.
+            radius: Distance to look for neighbors.
+            include_center: If True, include agents exactly at pos.
+
+        """
+        x, y = pos
+        cx_lo = int((x - radius - self.x_min) // self._cell_w)
+        cx_hi = int((x + radius - self.x_min) // self._cell_w)
+        cy_lo = int((y - radius - self.y_min) // self._cell_h)
+        cy_hi = int((y + radius - self.y_min) // self._cell_h)
+
+        if self.torus:
+            cxs = {cx % self._cells_x for cx in range(cx_lo, cx_hi + 1)}
+            cys = {cy % self._cells_y for cy in range(cy_lo, cy_hi + 1)}
+        else:
+            cxs = set(range(max(cx_lo, 0), min(cx_hi, self._cells_x - 1) + 1))
+            cys = set(range(max(cy_lo, 0), min(cy_hi, self._cells_y - 1) + 1))
+
+        neighbors = []
+        for cell in itertools.product(cxs, cys):
+            for agent in self._cells.get(cell, ()):
+                distance = self.get_distance(pos, agent.pos)
+                if distance <= radius and (include_center or distance > 0):
+                    neighbors.append(agent)
+        return neighbors
+
+    def get_pairs_within(self, radius: float) -> np.ndarray:
+        """Return every pair of agents closer than or at a distance.
+
+        Agents are binned into cells at least radius wide, and candidate
+        pairs from neighboring cells are generated and filtered with array
+        operations.
+
+        Returns:
+            A (P, 2) array of row pairs (i, j), i < j, into the agents list.
+
+        """
+        n = len(self._agent_list)
+        pos = self._positions[:n]
+        if n < 2:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        nx = max(1, int(self.width // radius)) if radius > 0 else 1
+        ny = max(1, int(self.height // radius)) if radius > 0 else 1
+        cx = np.minimum(
+            ((pos[:, 0] - self.x_min) * (nx / self.width)).astype(np.int64), nx - 1
+        )
+        cy = np.minimum(
+            ((pos[:, 1] - self.y_min) * (ny / self.height)).astype(np.int64), ny - 1
+        )
+
+        order = np.argsort(cx * ny + cy, kind="stable")
+        sorted_keys = (cx * ny + cy)[order]
+
+        rows = np.arange(n)
+        firsts, seconds = [], []
+        for dx, dy in itertools.product((-1, 0, 1), repeat=2):
+            tx, ty = cx + dx, cy + dy
+            if self.torus:
+                tx %= nx
+                ty %= ny
+                valid = np.ones(n, dtype=bool)
+            else:
+                valid = (tx >= 0) & (tx < nx) & (ty >= 0) & (ty < ny)
+
+            keys = tx * ny + ty
+            lo = np.searchsorted(sorted_keys, keys, side="left")
+            counts = np.where(
+                valid, np.searchsorted(sorted_keys, keys, side="right") - lo, 0
+            )
+            offsets = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            firsts.append(np.repeat(rows, counts))
+            seconds.append(order[np.repeat(lo, counts) + offsets])
+
+        i, j = np.concatenate(firsts), np.concatenate(seconds)
+        keep = i < j
+        i, j = i[keep], j[keep]
+        if self.torus and (nx < 3 or ny < 3):
+            # Few cells: the same neighbor cell can be reached twice.
+            i, j = np.divmod(np.unique(i * n + j), n)
+
+        delta = np.abs(pos[i] - pos[j])
+        if self.torus:
+            delta = np.minimum(delta, self.size - delta)
+        close = (delta ** 2).sum(axis=1) <= radius ** 2
+        return np.stack([i[close], j[close]], axis=1)
+
+    def get_heading(
+        self, pos_1: FloatCoordinate, pos_2: FloatCoordinate
+    ) -> FloatCoordinate:
+        """Get the heading vector between two points, accounting for toroidal
+        space. It is possible to calculate the heading angle by applying the
+        atan2 function to the result.
+
+        """
+        one = np.array(pos_1)
+        two = np.array(pos_2)
+        heading = two - one
+        if self.torus:
+            heading = (heading + self.size / 2) % self.size - self.size / 2
+        return heading
+
+    def get_distance(self, pos_1: FloatCoordinate, pos_2: FloatCoordinate) -> float:
+        """ Get the distance between two points, accounting for toroidal space. """
+        dx = abs(pos_1[0] - pos_2[0])
+        dy = abs(pos_1[1] - pos_2[1])
+        if self.torus:
+            dx = min(dx, self.width - dx)
+            dy = min(dy, self.height - dy)
+        return math.sqrt(dx * dx + dy * dy)
+
+    def torus_adj(self, pos: FloatCoordinate) -> FloatCoordinate:
+        """ Adjust coordinates to handle torus looping. """
+        if not self.out_of_bounds(pos):
+            return pos
+        elif not self.torus:
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        else:
+            x = self.x_min + ((pos[0] - self.x_min) % self.width)
+            y = self.y_min + ((pos[1] - self.y_min) % self.height)
+            if isinstance(pos, tuple):
+                return (x, y)
+            else:
+                return np.array((x, y))
+
+    def out_of_bounds(self, pos: FloatCoordinate) -> bool:
+        """ Check if a point is out of bounds. """
+        x, y = pos
+        return x < self.x_min or x >= self.x_max or y < self.y_min or y >= self.y_max
+
+
+class Tile(NamedTuple):
+    """ A rectangular block of cells [x0, x1) x [y0, y1) of a grid. """
+
+    index: int
+    x0: int
+    x1: int
+    y0: int
+    y1: int
+    color: int
+
+
+def _tile_bounds(length: int, tile_size: int) -> List[int]:
+    """Split range(length) into tiles at least tile_size long (unless the
+    whole range is shorter), as a list of boundaries.
+
+    """
+    count = max(1, length // tile_size)
+    return [length * i // count for i in range(count + 1)]
+
+
+def _tile_colors(count: int) -> List[int]:
+    """Color count tiles along one axis so that two tiles of the same color
+    are never adjacent, also across the torus seam.
+
+    """
+    colors = [i % 2 for i in range(count)]
+    if count > 1 and count % 2:
+        colors[-1] = 2
+    return colors
+
+
+def _run_tile_kernel(args: Tuple[Any, Dict[str, np.ndarray], Tile, int]) -> Any:
+    kernel, arrays, tile, halo = args
+    return kernel(arrays, tile, halo)
+
+
+class TileDecomposition:
+    """Split of a width x height grid into tiles with halo regions, for
+    stepping a model with local interactions on several cores.
+
+    Agents in one tile are assumed to read and write only cells within
+    halo cells of the tile. Tiles are colored so that tiles of the same
+    color are separated by at least one whole tile, and tiles are at least
+    2 * halo wide, so the halos of two tiles of the same color never
+    overlap: all tiles of one color can be updated in parallel, one color
+    after another. Updates made while processing one color are visible to
+    the next one, which is how boundary state is exchanged.
+
+    TiledActivation uses the decomposition to step agents tile by tile;
+    map_tiles runs an array kernel over the tiles, e.g. in a process pool.
+
+    """
+
+    def __init__(
+        self, width: int, height: int, torus: bool, tile_size: int, halo: int
+    ) -> None:
+        """Create a new decomposition.
+
+        Args:
+            width, height: The width and height of the grid.
+            torus: Boolean whether the grid wraps or not.
+            tile_size: Minimal side length of a tile, in cells.
+            halo: Interaction radius: how far, in cells, an agent may read or
+                  write outside its tile during one update.
+
+        """
+        if tile_size < 2 * halo:
+            raise ValueError("tile_size must be at least twice the halo.")
+
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.tile_size = tile_size
+        self.halo = halo
+
+        self.x_bounds = _tile_bounds(width, tile_size)
+        self.y_bounds = _tile_bounds(height, tile_size)
+        colors_x = _tile_colors(len(self.x_bounds) - 1)
+        colors_y = _tile_colors(len(self.y_bounds) - 1)
+
+        self.tiles: List[Tile] = []
+        for i, (x0, x1) in enumerate(zip(self.x_bounds, self.x_bounds[1:])):
+            for j, (y0, y1) in enumerate(zip(self.y_bounds, self.y_bounds[1:])):
+                color = colors_x[i] * 3 + colors_y[j]
+                self.tiles.append(Tile(len(self.tiles), x0, x1, y0, y1, color))
+
+        self.colors: List[List[Tile]] = [
+            [tile for tile in self.tiles if tile.color == color]
+            for color in sorted({tile.color for tile in self.tiles})
+        ]
+
+        # Tile index of every cell, for tile_of.
+        self._tile_x = np.repeat(
+            np.arange(len(self.x_bounds) - 1), np.diff(self.x_bounds)
+        )
+        self._tile_y = np.repeat(
+            np.arange(len(self.y_bounds) - 1), np.diff(self.y_bounds)
+        )
+
+    @classmethod
+    def for_grid(cls, grid: Grid, tile_size: int, halo: int) -> "TileDecomposition":
+        """ Create a decomposition matching the size and topology of a grid. """
+        return cls(grid.width, grid.height, grid.torus, tile_size, halo)
+
+    def tile_of(self, pos: Coordinate) -> Tile:
+        """ Return the tile containing a cell. """
+        x, y = pos
+        index = self._tile_x[x] * (len(self.y_bounds) - 1) + self._tile_y[y]
+        return self.tiles[index]
+
+    def extract(self, array: np.ndarray, tile: Tile, fill: Any = 0) -> np.ndarray:
+        """Return a copy of the tile plus its halo from a (width, height)
+        array. On a torus the halo wraps around; otherwise cells off the grid
+        are set to fill.
+
+        """
+        h = self.halo
+        xs = np.arange(tile.x0 - h, tile.x1 + h)
+        ys = np.arange(tile.y0 - h, tile.y1 + h)
+        if self.torus:
+            return array[np.ix_(xs % self.width, ys % self.height)]
+
+        block = np.full((len(xs), len(ys)), fill, dtype=array.dtype)
+        inside_x = (xs >= 0) & (xs < self.width)
+        inside_y = (ys >= 0) & (ys < self.height)
+        block[np.ix_(inside_x, inside_y)] = array[np.ix_(xs[inside_x], ys[inside_y])]
+        return block
+
+    def map_tiles(
+        self, kernel: Any, arrays: Dict[str, np.ndarray], executor: Any = None
+    ) -> None:
+        """Update (width, height) arrays tile by tile, one color at a time.
+
+        Args:
+            kernel: Function kernel(blocks, tile, halo) called once per tile,
+                    where blocks maps each array name to the tile plus halo
+                    (see extract). It returns a dictionary with new values
+                    for the interior of the tile, (x1 - x0, y1 - y0) arrays,
+                    for some or all of the names. Must be picklable to run
+                    in a process pool.
+            arrays: Dictionary of named (width, height) arrays, updated in
+                    place, e.g. property layer data.
+            executor: Optional concurrent.futures executor; the tiles of one
+                      color are submitted to it together. Without one the
+                      tiles run in the current process, in the same order.
+
+        """
+        for tiles in self.colors:
+            tasks = [
+                (
+                    kernel,
+                    {name: self.extract(a, tile) for name, a in arrays.items()},
+                    tile,
+                    self.halo,
+                )
+                for tile in tiles
+            ]
+            if executor is None:
+                results = map(_run_tile_kernel, tasks)
+            else:
+                results = executor.map(_run_tile_kernel, tasks)
+
+            for tile, interiors in zip(tiles, results):
+                for name, interior in interiors.items():
+                    arrays[name][tile.x0 : tile.x1, tile.y0 : tile.y1] = interior
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing shared memory block without taking ownership
+    of it, so that the reader exiting does not unlink it.
+
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)  # type: ignore
+
+    # Before Python 3.13 attaching always registers the block with the
+    # resource tracker, which unlinks it when the reader exits. Processes
+    # started by multiprocessing share the tracker of their parent, which
+    # normally owns the block, as does this process for its own blocks; the
+    # registration is a no-op then, and must stay.
+    block = shared_memory.SharedMemory(name=name)
+    if multiprocessing.parent_process() is None and name not in _owned_blocks:
+        resource_tracker.unregister(block._name, "shared_memory")  # type: ignore
+    return block
+
+
+class SharedGridView:
+    """Read-only, zero-copy view of a grid whose arrays were shared by
+    another process with Grid.share_memory, e.g. for a plotting worker, a
+    metrics exporter or a checkpoint writer.
+
+    Attributes:
+        width, height, torus: As on the shared grid.
+        occupancy: The slot array of an array-backed SingleGrid (0 means
+                   empty), or None.
+        layers: Dictionary of the shared property layer arrays, by name.
+
+    """
+
+    def __init__(self, manifest: Dict[str, Any]) -> None:
+        """Attach to the arrays described by a share_memory manifest."""
+        self.width = manifest["width"]
+        self.height = manifest["height"]
+        self.torus = manifest["torus"]
+
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self.occupancy: Optional[np.ndarray] = None
+        self.layers: Dict[str, np.ndarray] = dict()
+
+        for key, (name, shape, dtype) in manifest["arrays"].items():
+            block = _attach_shared_memory(name)
+            self._blocks.append(block)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            if key == "occupancy":
+                self.occupancy = array
+            else:
+                self.layers[key[len("layer:") :]] = array
+
+    def occupancy_mask(self) -> np.ndarray:
+        """ Return a (width, height) boolean array of the occupied cells. """
+        if self.occupancy is None:
+            raise Exception("The shared grid has no occupancy array")
+        return self.occupancy != 0
+
+    def close(self) -> None:
+        """ Detach from the shared arrays. """
+        self.occupancy = None
+        self.layers = dict()
+        for block in self._blocks:
+            block.close()
+        self._blocks = []
+
+    def __enter__(self) -> "SharedGridView":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def attach_shared_grid(manifest: Dict[str, Any]) -> SharedGridView:
+    """ Attach to a grid shared with Grid.share_memory, read-only. """
+    return SharedGridView(manifest)
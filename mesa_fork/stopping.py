@@ -0,0 +1,243 @@
+"""
+Mesa Stopping Module
+====================
+
+Criteria for stopping a run early, checked after every step by
+Model.run_model and the batch runners.
+
+StoppingCriterion: base class of the criteria.
+Plateau: stop when model variables stay flat over a window of steps.
+AbsorbingState: stop when the model reaches a state it cannot leave.
+StepBudget: stop after a number of steps.
+WallClockBudget: stop after an amount of wall-clock time.
+AnyOf: stop as soon as any of several criteria does.
+
+Model variables are given as model attribute names, or as functions of the
+model like DataCollector reporters. The batch runners copy the criteria
+into every run, and BatchRunnerMP pickles them to its worker processes, so
+functions must then be defined at module level: lambdas and nested
+functions cannot be pickled. Attribute names, e.g. of a property, always
+work:
+
+    stopping = [
+        Plateau("cooperator_share", window=100),
+        AbsorbingState(condition="extinct"),
+    ]
+
+"""
+from operator import attrgetter
+from time import perf_counter
+
+import numpy as np
+
+# mypy
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+Reporter = Union[str, Callable[[Any], Any]]
+
+
+class StoppingCriterion:
+    """Base class for stopping criteria.
+
+    A criterion is reset at the start of a run and checked after every step;
+    it returns the reason to stop, a short string which is recorded as the
+    model's stop_reason, or None to go on.
+
+    """
+
+    reason = "stopped"
+
+    def reset(self, model: Any) -> None:
+        """ Start watching a new run of model. """
+        pass
+
+    def check(self, model: Any) -> Optional[str]:
+        """ Return the reason to stop after the step just taken, or None. """
+        return None
+
+
+class Plateau(StoppingCriterion):
+    """Stop when every watched model variable has had a variance of at most
+    tolerance over the last window steps, e.g. a stable share of
+    cooperators.
+
+    """
+
+    reason = "plateau"
+
+    def __init__(
+        self,
+        variables: Union[Reporter, Iterable[Reporter], Dict[str, Reporter]],
+        window: int = 50,
+        tolerance: float = 1e-4,
+        min_steps: int = 0,
+    ) -> None:
+        """Create a new Plateau criterion.
+
+        Args:
+            variables: The variables to watch, as model attribute names or
+                       module-level functions of the model, like
+                       DataCollector model reporters; one, a list, or a
+                       dictionary by name.
+            window: Number of most recent steps to compute the variance over.
+            tolerance: Largest variance still counted as flat.
+            min_steps: Do not stop before this many steps of the run.
+
+        """
+        if isinstance(variables, dict):
+            variables = list(variables.values())
+        elif isinstance(variables, str) or callable(variables):
+            variables = [variables]
+        self.reporters: List[Callable[[Any], Any]] = [
+            attrgetter(variable) if isinstance(variable, str) else variable
+            for variable in variables
+        ]
+        self.window = window
+        self.tolerance = tolerance
+        self.min_steps = min_steps
+        self._values = np.zeros((window, len(self.reporters)))
+        self._steps = 0
+
+    def reset(self, model: Any) -> None:
+        self._values[:] = 0
+        self._steps = 0
+
+    def check(self, model: Any) -> Optional[str]:
+        # Ring buffer of the last window values of every variable
+        self._values[self._steps % self.window] = [
+            reporter(model) for reporter in self.reporters
+        ]
+        self._steps += 1
+        if self._steps < max(self.window, self.min_steps):
+            return None
+        if np.all(self._values.var(axis=0) <= self.tolerance):
+            return self.reason
+        return None
+
+
+class AbsorbingState(StoppingCriterion):
+    """Stop when the model reaches an absorbing state: when condition holds,
+    e.g. no agents or no defectors are left, or when state has not changed
+    for patience steps.
+
+    """
+
+    reason = "absorbing_state"
+
+    def __init__(
+        self,
+        condition: Optional[Reporter] = None,
+        state: Optional[Reporter] = None,
+        patience: int = 1,
+    ) -> None:
+        """Create a new AbsorbingState criterion.
+
+        Args:
+            condition: Model attribute name or module-level function of the
+                       model, true in an absorbing state.
+            state: Model attribute name or module-level function of the
+                   model returning its state, e.g. an array of the grid;
+                   compared with the previous step's.
+            patience: Number of unchanged steps after which to stop.
+
+        """
+        if condition is None and state is None:
+            raise ValueError("Set condition, state or both")
+        self.condition = (
+            attrgetter(condition) if isinstance(condition, str) else condition
+        )
+        self.state = attrgetter(state) if isinstance(state, str) else state
+        self.patience = patience
+        self._previous: Any = None
+        self._unchanged = 0
+
+    def reset(self, model: Any) -> None:
+        self._previous = None if self.state is None else self._capture(model)
+        self._unchanged = 0
+
+    def check(self, model: Any) -> Optional[str]:
+        if self.condition is not None and self.condition(model):
+            return self.reason
+        if self.state is None:
+            return None
+
+        current = self._capture(model)
+        if _equal(current, self._previous):
+            self._unchanged += 1
+        else:
+            self._unchanged = 0
+        self._previous = current
+        if self._unchanged >= self.patience:
+            return self.reason
+        return None
+
+    def _capture(self, model: Any) -> Any:
+        state = self.state(model)  # type: ignore
+        # Arrays may be updated in place, so keep a copy
+        return state.copy() if isinstance(state, np.ndarray) else state
+
+
+class StepBudget(StoppingCriterion):
+    """ Stop after a number of steps of the run. """
+
+    reason = "step_budget"
+
+    def __init__(self, max_steps: int) -> None:
+        self.max_steps = max_steps
+        self._steps = 0
+
+    def reset(self, model: Any) -> None:
+        self._steps = 0
+
+    def check(self, model: Any) -> Optional[str]:
+        self._steps += 1
+        return self.reason if self._steps >= self.max_steps else None
+
+
+class WallClockBudget(StoppingCriterion):
+    """ Stop after the first step which ends past a wall-clock budget. """
+
+    reason = "wall_clock_budget"
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self._start = perf_counter()
+
+    def reset(self, model: Any) -> None:
+        self._start = perf_counter()
+
+    def check(self, model: Any) -> Optional[str]:
+        if perf_counter() - self._start >= self.seconds:
+            return self.reason
+        return None
+
+
+class AnyOf(StoppingCriterion):
+    """ Stop as soon as any of the criteria does, with its reason. """
+
+    def __init__(self, *criteria: StoppingCriterion) -> None:
+        self.criteria = list(criteria)
+
+    def reset(self, model: Any) -> None:
+        for criterion in self.criteria:
+            criterion.reset(model)
+
+    def check(self, model: Any) -> Optional[str]:
+        # Every criterion sees every step, to keep their windows up to date
+        reasons = [criterion.check(model) for criterion in self.criteria]
+        return next((reason for reason in reasons if reason is not None), None)
+
+
+def as_criterion(
+    stopping: Union[None, StoppingCriterion, Iterable[StoppingCriterion]]
+) -> Optional[StoppingCriterion]:
+    """ Turn a criterion, a list of criteria or None into a criterion. """
+    if stopping is None or isinstance(stopping, StoppingCriterion):
+        return stopping
+    return AnyOf(*stopping)
+
+
+def _equal(a: Any, b: Any) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    return bool(a == b)
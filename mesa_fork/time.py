@@ -21,12 +21,139 @@ Key concepts:
     model has taken.
 """
 
-from collections import OrderedDict
+import heapq
+import operator
+from time import perf_counter
+from collections.abc import MutableMapping
+
+import numpy as np
 
 # mypy
-from typing import Dict, Iterator, List, Optional, Union
-from mesa.agent import Agent
-from mesa.model import Model
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from .agent import Agent
+from .model import Model
+
+
+class SchedulerStats:
+    """Counters filled by an instrumented scheduler, see
+    BaseScheduler.enable_stats.
+
+    Per step, in preallocated arrays indexed by step number: the wall time of
+    the model step (recorded by Model.run_model), the time spent inside
+    agent activations, the number of activations, and the agents added and
+    removed. Per agent class (or bulk stage function): the total activation
+    time and count.
+
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.rows = 0
+        self.step_time = np.zeros(capacity)
+        self.agent_time = np.zeros(capacity)
+        self.activations = np.zeros(capacity, dtype=np.int64)
+        self.added = np.zeros(capacity, dtype=np.int64)
+        self.removed = np.zeros(capacity, dtype=np.int64)
+        self.type_time: Dict[Any, float] = dict()
+        self.type_activations: Dict[Any, int] = dict()
+
+    def _row(self, step: int) -> int:
+        """ Make room for the given step and return its row. """
+        if step >= len(self.step_time):
+            capacity = max(2 * len(self.step_time), step + 1)
+            for name in ("step_time", "agent_time", "activations", "added", "removed"):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[: len(column)] = column
+                setattr(self, name, grown)
+        self.rows = max(self.rows, step + 1)
+        return step
+
+    def record(self, step: int, key: Any, elapsed: float, count: int = 1) -> None:
+        """ Add one (or count) timed activations of key to step. """
+        row = self._row(step)
+        self.agent_time[row] += elapsed
+        self.activations[row] += count
+        self.type_time[key] = self.type_time.get(key, 0.0) + elapsed
+        self.type_activations[key] = self.type_activations.get(key, 0) + count
+
+    def record_churn(self, step: int, added: int = 0, removed: int = 0) -> None:
+        """ Count agents added to and removed from the schedule in step. """
+        row = self._row(step)
+        self.added[row] += added
+        self.removed[row] += removed
+
+    def record_step(self, step: int, elapsed: float) -> None:
+        """ Set the wall time of a model step. """
+        self.step_time[self._row(step)] = elapsed
+
+    def time_agents(self, step: int, agents: Iterable[Agent]) -> Iterator[Agent]:
+        """Yield the agents, timing what the caller does with each one
+        until it asks for the next.
+
+        """
+        clock = perf_counter
+        type_time = self.type_time
+        type_activations = self.type_activations
+        total = 0.0
+        count = 0
+        try:
+            for agent in agents:
+                start = clock()
+                yield agent
+                elapsed = clock() - start
+                key = type(agent)
+                type_time[key] = type_time.get(key, 0.0) + elapsed
+                type_activations[key] = type_activations.get(key, 0) + 1
+                total += elapsed
+                count += 1
+        finally:
+            row = self._row(step)
+            self.agent_time[row] += total
+            self.activations[row] += count
+
+    def to_frame(self) -> Any:
+        """ Return the per step counters as a pandas DataFrame. """
+        import pandas as pd
+
+        rows = self.rows
+        return pd.DataFrame(
+            {
+                "step_time": self.step_time[:rows],
+                "agent_time": self.agent_time[:rows],
+                "activations": self.activations[:rows],
+                "added": self.added[:rows],
+                "removed": self.removed[:rows],
+            },
+            index=pd.RangeIndex(rows, name="step"),
+        )
+
+    def agent_type_frame(self) -> Any:
+        """ Return the per agent class counters as a pandas DataFrame. """
+        import pandas as pd
+
+        keys = list(self.type_time)
+        frame = pd.DataFrame(
+            {
+                "time": [self.type_time[key] for key in keys],
+                "activations": [self.type_activations[key] for key in keys],
+            },
+            index=pd.Index(
+                [getattr(key, "__name__", str(key)) for key in keys], name="agent_type"
+            ),
+        )
+        frame["mean_time"] = frame["time"] / frame["activations"]
+        return frame
 
 
 # BaseScheduler has a self.time of int, while
@@ -34,6 +161,110 @@ from mesa.model import Model
 TimeT = Union[float, int]
 
 
+class AgentRegistry(MutableMapping):
+    """The agents of a scheduler by unique_id, kept in a dense list in the
+    order they were added.
+
+    Removing an agent leaves a tombstone (None) in its slot, so that the
+    slots do not move while the scheduler iterates over them. The list is
+    compacted, keeping the order, once no iteration is running and the
+    tombstones make up half of it; until then live() hands out a filtered
+    copy, built once per change.
+
+    """
+
+    def __init__(self) -> None:
+        self._slots: List[Optional[Agent]] = []
+        self._index: Dict[int, int] = dict()
+        self._tombstones = 0
+        # Number of running iter_slots generators
+        self._iterating = 0
+        # Whether _slots was handed out by live(), see _own_slots
+        self._shared = False
+        self._live: Optional[List[Agent]] = None
+
+    def __getitem__(self, key: int) -> Agent:
+        return self._slots[self._index[key]]  # type: ignore
+
+    def __setitem__(self, key: int, agent: Agent) -> None:
+        self._own_slots()
+        if key in self._index:
+            self._slots[self._index[key]] = agent
+        else:
+            self._index[key] = len(self._slots)
+            self._slots.append(agent)
+
+    def __delitem__(self, key: int) -> None:
+        slot = self._index.pop(key)
+        self._own_slots()
+        self._slots[slot] = None
+        self._tombstones += 1
+        if not self._iterating and 2 * self._tombstones > len(self._slots):
+            self._compact()
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def values(self) -> List[Agent]:  # type: ignore
+        return self.live()
+
+    def live(self) -> List[Agent]:
+        """Return the list of agents, in the order they were added.
+
+        Without pending removals this is the registry's own list, handed out
+        without a copy; the registry copies it before changing it, so the
+        caller keeps a consistent snapshot. Do not modify it.
+
+        """
+        if self._tombstones:
+            if self._live is None:
+                self._live = [agent for agent in self._slots if agent is not None]
+            return self._live
+        self._shared = True
+        return self._slots  # type: ignore
+
+    def iter_slots(self) -> Iterator[Agent]:
+        """Yield the agents present when the iteration started, in order,
+        skipping the ones removed since.
+
+        """
+        self._iterating += 1
+        try:
+            for i in range(len(self._slots)):
+                agent = self._slots[i]
+                if agent is not None:
+                    yield agent
+        finally:
+            self._end_iteration()
+
+    def _end_iteration(self) -> None:
+        """ Close an iteration, compacting if removals piled up during it. """
+        self._iterating -= 1
+        if not self._iterating and 2 * self._tombstones > len(self._slots):
+            self._compact()
+
+    def _own_slots(self) -> None:
+        """ Copy _slots before changing it if live() handed it out. """
+        self._live = None
+        if self._shared:
+            self._slots = list(self._slots)
+            self._shared = False
+
+    def _compact(self) -> None:
+        """ Drop the tombstones, keeping the order of the agents. """
+        self._slots = [agent for agent in self._slots if agent is not None]
+        self._index = {key: slot for slot, key in enumerate(self._index)}
+        self._tombstones = 0
+        self._shared = False
+        self._live = None
+
+
 class BaseScheduler:
     """Simplest scheduler; activates agents one at a time, in the order
     they were added.
@@ -49,7 +280,9 @@ class BaseScheduler:
         self.model = model
         self.steps = 0
         self.time: TimeT = 0
-        self._agents: Dict[int, Agent] = OrderedDict()
+        self._agents = AgentRegistry()
+        # Instrumentation, off unless enable_stats is called
+        self.stats: Optional[SchedulerStats] = None
 
     def add(self, agent: Agent) -> None:
         """Add an Agent object to the schedule.
@@ -68,6 +301,8 @@ class BaseScheduler:
             )
 
         self._agents[agent.unique_id] = agent
+        if self.stats is not None:
+            self.stats.record_churn(self.steps, added=1)
 
     def remove(self, agent: Agent) -> None:
         """Remove all instances of a given agent from the schedule.
@@ -77,34 +312,126 @@ class BaseScheduler:
 
         """
         del self._agents[agent.unique_id]
+        if self.stats is not None:
+            self.stats.record_churn(self.steps, removed=1)
+
+    def enable_stats(self, capacity: int = 1024) -> SchedulerStats:
+        """Start recording the time spent in every step, per agent class,
+        and the agents added and removed.
+
+        Args:
+            capacity: Number of steps to preallocate counters for; they grow
+                      as needed.
+
+        Returns:
+            The SchedulerStats being filled, also available as stats.
+
+        """
+        self.stats = SchedulerStats(capacity)
+        return self.stats
+
+    def disable_stats(self) -> None:
+        """ Stop recording, dropping the counters. """
+        self.stats = None
+
+    def _activations(self, agents: Iterable[Agent]) -> Iterable[Agent]:
+        """ Pass the agents about to be activated through the stats. """
+        if self.stats is None:
+            return agents
+        return self.stats.time_agents(self.steps, agents)
 
     def step(self) -> None:
         """ Execute the step of all the agents, one at a time. """
-        for agent in self.agent_buffer(shuffled=False):
+        for agent in self._activations(self.agent_buffer(shuffled=False)):
             agent.step()
         self.steps += 1
         self.time += 1
 
     def get_agent_count(self) -> int:
         """ Returns the current number of agents in the queue. """
-        return len(self._agents.keys())
+        return len(self._agents)
 
     @property
     def agents(self) -> List[Agent]:
-        return list(self._agents.values())
+        """ The agents, in the order they were added. Do not modify. """
+        return self._agents.live()
+
+    def _run_stage(
+        self, agents: List[Agent], stage: Union[str, Callable[[List[Agent]], Any]]
+    ) -> None:
+        """Run one stage, an agent method name or a function of the list of
+        agents, skipping the agents removed since the step started.
+
+        """
+        registry = self._agents
+        if callable(stage):
+            agents = [agent for agent in agents if agent.unique_id in registry]
+            if self.stats is None:
+                stage(agents)
+                return
+            start = perf_counter()
+            stage(agents)
+            self.stats.record(self.steps, stage, perf_counter() - start, len(agents))
+            return
+        # Agents are checked as they come up, to skip those removed mid-stage
+        for agent in self._activations(
+            agent for agent in agents if agent.unique_id in registry
+        ):
+            getattr(agent, stage)()
+
+    def activation_order(
+        self, fraction: Optional[float] = None, rate: Optional[float] = None
+    ) -> np.ndarray:
+        """Draw the activations of one step with the model's NumPy
+        generator, as indices into the agents list.
+
+        Args:
+            fraction: If set, activate round(fraction * N) distinct agents,
+                      chosen at random.
+            rate: If set, give every agent a Poisson clock of this rate per
+                  step instead: the number of activations is Poisson(rate * N)
+                  and each goes to a uniformly chosen agent, so an agent can
+                  be activated several times or not at all.
+
+        Returns:
+            The indices, in activation order. Without fraction or rate, a
+            permutation of all of them.
+
+        """
+        n = len(self._agents)
+        rng = self.model.np_random
+        if fraction is not None and rate is not None:
+            raise ValueError("Set at most one of fraction and rate")
+        if rate is not None:
+            return rng.integers(n, size=rng.poisson(rate * n))
+        if fraction is not None:
+            return rng.choice(n, size=int(round(fraction * n)), replace=False)
+        return rng.permutation(n)
 
     def agent_buffer(self, shuffled: bool = False) -> Iterator[Agent]:
         """Simple generator that yields the agents while letting the user
         remove and/or add agents during stepping.
 
         """
-        agent_keys = list(self._agents.keys())
-        if shuffled:
-            self.model.random.shuffle(agent_keys)
-
-        for key in agent_keys:
-            if key in self._agents:
-                yield self._agents[key]
+        if not shuffled:
+            yield from self._agents.iter_slots()
+            return
+
+        registry = self._agents
+        index = registry._index
+        agent_keys = list(index)
+        self.model.random.shuffle(agent_keys)
+
+        # Removed agents leave the index; the registry does not compact
+        # while iterating, so the slots of the others stay put.
+        registry._iterating += 1
+        try:
+            for key in agent_keys:
+                slot = index.get(key)
+                if slot is not None:
+                    yield registry._slots[slot]  # type: ignore
+        finally:
+            registry._end_iteration()
 
 
 class RandomActivation(BaseScheduler):
@@ -118,12 +445,569 @@ class RandomActivation(BaseScheduler):
 
     """
 
+    def __init__(
+        self,
+        model: Model,
+        vectorized: bool = False,
+        fraction: Optional[float] = None,
+        rate: Optional[float] = None,
+    ) -> None:
+        """Create a new, empty RandomActivation scheduler.
+
+        Args:
+            model: The model the scheduler belongs to.
+            vectorized: If True, draw the order as a NumPy permutation from
+                        model.np_random instead of shuffling a list with
+                        model.random. The orders differ, for the same seed.
+            fraction, rate: Activate only a random fraction of the agents, or
+                            follow Poisson clocks; see activation_order.
+                            Implies vectorized.
+
+        """
+        super().__init__(model)
+        self.vectorized = vectorized or fraction is not None or rate is not None
+        self.fraction = fraction
+        self.rate = rate
+
     def step(self) -> None:
         """Executes the step of all agents, one at a time, in
         random order.
 
         """
-        for agent in self.agent_buffer(shuffled=True):
-            agent.step()
+        if not self.vectorized:
+            for agent in self._activations(self.agent_buffer(shuffled=True)):
+                agent.step()
+        else:
+            registry = self._agents
+            order = self.activation_order(self.fraction, self.rate)
+            due = map(self.agents.__getitem__, order.tolist())
+            for agent in self._activations(
+                agent for agent in due if agent.unique_id in registry
+            ):
+                agent.step()
+        self.steps += 1
+        self.time += 1
+
+
+def _freeze(value: Any) -> Any:
+    """Return a snapshot with read-only copies of the NumPy arrays in value,
+    so that the live arrays stay writable and later writes do not show
+    through; see SimultaneousActivation.
+
+    """
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.flags.writeable = False
+        return value
+    if isinstance(value, dict):
+        return type(value)((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return type(value)(*(_freeze(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return type(value)(_freeze(item) for item in value)
+    return value
+
+
+class SimultaneousActivation(BaseScheduler):
+    """A scheduler to simulate the simultaneous activation of all the agents.
+
+    This scheduler requires that each agent have two methods: step and
+    advance. step() activates the agent and stages any necessary changes, but
+    does not apply them yet. advance() then applies the changes.
+
+    The step methods can read the state of the previous step from a frozen
+    snapshot: if a snapshot function is given, it is called with the model at
+    the start of every step, and its result, with any NumPy arrays in it
+    replaced by read-only copies, is available as the scheduler's frozen
+    attribute until the next step.
+
+    """
+
+    def __init__(
+        self, model: Model, snapshot: Optional[Callable[[Model], Any]] = None
+    ) -> None:
+        """Create a new, empty SimultaneousActivation scheduler.
+
+        Args:
+            model: The model the scheduler belongs to.
+            snapshot: Optional function of the model returning the state the
+                      step methods read, e.g. grid.to_array("cooperator").
+
+        """
+        super().__init__(model)
+        self.snapshot = snapshot
+        self.frozen: Any = None
+
+    def step(self) -> None:
+        """ Step all agents, then advance them. """
+        if self.snapshot is not None:
+            self.frozen = _freeze(self.snapshot(self.model))
+        agents = list(self._agents.live())
+        self._run_stage(agents, "step")
+        self._run_stage(agents, "advance")
+        self.steps += 1
+        self.time += 1
+
+
+class StagedActivation(BaseScheduler):
+    """A scheduler which allows agent activation to be divided into several
+    stages instead of a single `step` method. All agents execute one stage
+    before moving on to the next.
+
+    Agents must have all the stage methods implemented. Stage methods take no
+    arguments. A stage can also be given as a function, which is called once
+    per step with the list of agents, to run the stage in bulk, e.g. as a
+    vectorized update.
+
+    This schedule tracks steps and time separately. Time advances in fractional
+    increments of 1 / (# of stages), meaning that 1 step = 1 unit of time.
+
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        stage_list: Optional[List[Union[str, Callable[[List[Agent]], Any]]]] = None,
+        shuffle: bool = False,
+        shuffle_between_stages: bool = False,
+        snapshot: Optional[Callable[[Model], Any]] = None,
+    ) -> None:
+        """Create an empty Staged Activation schedule.
+
+        Args:
+            model: Model object associated with the schedule.
+            stage_list: List of the stages to run, in order; names of agent
+                        methods, or functions of the list of agents. Defaults
+                        to ["step"].
+            shuffle: If True, shuffle the order of agents each step.
+            shuffle_between_stages: If True, shuffle the agents after each
+                                    stage; otherwise, only shuffle at the start
+                                    of each step.
+            snapshot: Optional function of the model taken at the start of
+                      every step and kept, read-only, as the frozen
+                      attribute; see SimultaneousActivation.
+
+        """
+        super().__init__(model)
+        self.stage_list = ["step"] if not stage_list else stage_list
+        self.shuffle = shuffle
+        self.shuffle_between_stages = shuffle_between_stages
+        self.stage_time = 1 / len(self.stage_list)
+        self.snapshot = snapshot
+        self.frozen: Any = None
+
+    def step(self) -> None:
+        """ Executes all the stages for all agents. """
+        if self.snapshot is not None:
+            self.frozen = _freeze(self.snapshot(self.model))
+        agents = list(self._agents.live())
+        if self.shuffle:
+            self.model.random.shuffle(agents)
+        for stage in self.stage_list:
+            self._run_stage(agents, stage)
+            if self.shuffle_between_stages:
+                self.model.random.shuffle(agents)
+            self.time += self.stage_time
+
+        self.steps += 1
+
+
+class RandomActivationByType(BaseScheduler):
+    """A scheduler which activates each type of agent once per step, in
+    random order, with the order reshuffled every step.
+
+    Agents are kept in buckets by a type key: their class by default, or an
+    attribute or function of the agent, e.g. "cooperator". The number of
+    agents of each type is kept up to date on add, remove and update_type,
+    so population counts cost nothing per step.
+
+    Assumes that all agents have a step() method.
+
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        type_key: Union[None, str, Callable[[Agent], Any]] = None,
+        type_order: Optional[List[Any]] = None,
+    ) -> None:
+        """Create a new, empty RandomActivationByType scheduler.
+
+        Args:
+            model: The model the scheduler belongs to.
+            type_key: Name of the agent attribute, or function of the agent,
+                      giving its type. Defaults to the agent's class.
+            type_order: Optional order in which to activate the types when
+                        they are not shuffled; types not listed come after,
+                        in the order they first appeared.
+
+        """
+        super().__init__(model)
+        if type_key is None:
+            self._type_of: Callable[[Agent], Any] = type
+        elif isinstance(type_key, str):
+            self._type_of = operator.attrgetter(type_key)
+        else:
+            self._type_of = type_key
+        self.type_order = type_order
+        self.agents_by_type: Dict[Any, Dict[int, Agent]] = dict()
+        self._agent_types: Dict[int, Any] = dict()
+
+    def add(self, agent: Agent) -> None:
+        """Add an Agent object to the schedule, in the bucket of its type.
+
+        Args:
+            agent: An Agent to be added to the schedule.
+
+        """
+        super().add(agent)
+        self._add_to_bucket(agent, self._type_of(agent))
+
+    def remove(self, agent: Agent) -> None:
+        """Remove all instances of a given agent from the schedule.
+
+        Args:
+            agent: An agent object.
+
+        """
+        super().remove(agent)
+        self._remove_from_bucket(agent)
+
+    def update_type(self, agent: Agent) -> None:
+        """Move an agent to the bucket of its current type, after the
+        attribute its type is derived from changed.
+
+        Args:
+            agent: An agent of the schedule.
+
+        """
+        agent_type = self._type_of(agent)
+        if agent_type != self._agent_types[agent.unique_id]:
+            self._remove_from_bucket(agent)
+            self._add_to_bucket(agent, agent_type)
+
+    def _add_to_bucket(self, agent: Agent, agent_type: Any) -> None:
+        self.agents_by_type.setdefault(agent_type, dict())[agent.unique_id] = agent
+        self._agent_types[agent.unique_id] = agent_type
+
+    def _remove_from_bucket(self, agent: Agent) -> None:
+        agent_type = self._agent_types.pop(agent.unique_id)
+        del self.agents_by_type[agent_type][agent.unique_id]
+
+    def step(self, shuffle_types: bool = True, shuffle_agents: bool = True) -> None:
+        """Executes the step of each agent type, one at a time, in random
+        order.
+
+        Args:
+            shuffle_types: If True, the order of execution of each type is
+                           shuffled, otherwise it follows type_order.
+            shuffle_agents: If True, the order of execution of each agent in a
+                            type group is shuffled.
+
+        """
+        type_keys = self._type_keys()
+        if shuffle_types:
+            self.model.random.shuffle(type_keys)
+        # Agents changing type during the step are still stepped only once
+        buckets = [list(self.agents_by_type[key].values()) for key in type_keys]
+        for agents in buckets:
+            if shuffle_agents:
+                self.model.random.shuffle(agents)
+            self._run_stage(agents, "step")
+        self.steps += 1
+        self.time += 1
+
+    def step_type(self, type_class: Any, shuffle_agents: bool = True) -> None:
+        """Shuffle order and run all agents of a given type.
+
+        Args:
+            type_class: The type key of the agents to run.
+            shuffle_agents: If True, shuffle the order of the agents.
+
+        """
+        agents = list(self.agents_by_type.get(type_class, dict()).values())
+        if shuffle_agents:
+            self.model.random.shuffle(agents)
+        self._run_stage(agents, "step")
+
+    def get_type_count(self, type_class: Any) -> int:
+        """ Returns the current number of agents of a given type. """
+        return len(self.agents_by_type.get(type_class, ()))
+
+    def type_counts(self) -> Dict[Any, int]:
+        """ Returns the current number of agents of every type. """
+        return {key: len(bucket) for key, bucket in self.agents_by_type.items()}
+
+    def _type_keys(self) -> List[Any]:
+        """ The types with agents, following type_order if set. """
+        keys = [key for key, bucket in self.agents_by_type.items() if bucket]
+        if self.type_order is not None:
+            order = {key: i for i, key in enumerate(self.type_order)}
+            keys.sort(key=lambda key: order.get(key, len(order)))
+        return keys
+
+
+class DiscreteEventScheduler(BaseScheduler):
+    """A scheduler which activates agents at the times they ask for, from a
+    priority queue, instead of visiting every agent every step.
+
+    An agent is activated at the time it was added for. After each
+    activation it is rescheduled reschedule_interval later, unless it called
+    schedule, sleep or wake on itself while active. A sleeping agent is not
+    activated until something wakes it, e.g. a neighbor dying or arriving;
+    see wake_neighbors. Rescheduled, sleeping and removed agents leave stale
+    entries in the queue, which are skipped when they come up.
+
+    Each call to step processes the events of one unit of time, in time
+    order, so a model stepping it pays only for the agents which are due.
+    Events at the same time are run in random order if shuffled, else in the
+    order they were scheduled.
+
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        reschedule_interval: Optional[float] = 1,
+        shuffled: bool = True,
+    ) -> None:
+        """Create a new, empty DiscreteEventScheduler.
+
+        Args:
+            model: The model the scheduler belongs to.
+            reschedule_interval: Delay after which an agent that did not
+                                 schedule itself is activated again; None to
+                                 put it to sleep instead.
+            shuffled: If True, ties between events at the same time are
+                      broken at random, else by scheduling order.
+
+        """
+        super().__init__(model)
+        self.reschedule_interval = reschedule_interval
+        self.shuffled = shuffled
+        self._queue: List[Tuple[TimeT, float, int, int, int]] = []
+        self._sequence = 0
+        # Version of the current queue entry of every agent; replacing it
+        # invalidates the entry. Versions are drawn from _sequence, so they
+        # never repeat, even for an agent removed and added again.
+        self._versions: Dict[int, int] = dict()
+        self._next_times: Dict[int, TimeT] = dict()
+        self._sleeping: Set[int] = set()
+        # End of the running step, None outside of step
+        self._step_end: Optional[TimeT] = None
+
+    def add(self, agent: Agent, time: Optional[TimeT] = None) -> None:
+        """Add an Agent object to the schedule.
+
+        Args:
+            agent: An Agent to be added to the schedule.
+            time: Time of its first activation. Defaults to the next step
+                  that has not started.
+
+        """
+        super().add(agent)
+        self._versions[agent.unique_id] = 0
+        self.schedule(agent, self._default_time() if time is None else time)
+
+    def remove(self, agent: Agent) -> None:
+        """Remove all instances of a given agent from the schedule.
+
+        Args:
+            agent: An agent object.
+
+        """
+        super().remove(agent)
+        del self._versions[agent.unique_id]
+        self._next_times.pop(agent.unique_id, None)
+        self._sleeping.discard(agent.unique_id)
+
+    def schedule(self, agent: Agent, time: TimeT) -> None:
+        """Set the time of the next activation of an agent, replacing any
+        earlier one, and wake it if asleep.
+
+        Args:
+            agent: An agent of the schedule.
+            time: The time, no earlier than the current time.
+
+        """
+        if time < self.time:
+            raise Exception(
+                "Cannot schedule agent {} at {}, before the current time {}".format(
+                    repr(agent.unique_id), time, self.time
+                )
+            )
+        key = agent.unique_id
+        if key not in self._versions:
+            raise Exception(
+                "Agent {} is not in the schedule".format(repr(agent.unique_id))
+            )
+        version = self._next_version()
+        self._versions[key] = version
+        self._next_times[key] = time
+        self._sleeping.discard(key)
+        tiebreak = self.model.random.random() if self.shuffled else 0.0
+        heapq.heappush(self._queue, (time, tiebreak, version, key, version))
+        if len(self._queue) > 2 * len(self._versions) + 64:
+            self._compact()
+
+    def schedule_in(self, agent: Agent, delay: TimeT) -> None:
+        """ Schedule the next activation of an agent delay after now. """
+        self.schedule(agent, self.time + delay)
+
+    def sleep(self, agent: Agent) -> None:
+        """ Cancel the next activation of an agent until it is woken. """
+        key = agent.unique_id
+        if key not in self._versions:
+            raise Exception(
+                "Agent {} is not in the schedule".format(repr(agent.unique_id))
+            )
+        self._versions[key] = self._next_version()
+        self._next_times.pop(key, None)
+        self._sleeping.add(key)
+
+    def wake(self, agent: Agent, time: Optional[TimeT] = None) -> None:
+        """Activate an agent at time if it is asleep or due later.
+
+        Args:
+            agent: An agent of the schedule.
+            time: Defaults to the next step that has not started.
+
+        """
+        if time is None:
+            time = self._default_time()
+        next_time = self._next_times.get(agent.unique_id)
+        if next_time is None or time < next_time:
+            self.schedule(agent, time)
+
+    def wake_neighbors(
+        self,
+        grid: Any,
+        pos: Any,
+        moore: bool = True,
+        include_center: bool = False,
+        radius: int = 1,
+        time: Optional[TimeT] = None,
+    ) -> None:
+        """ Wake the agents of the grid around pos, see wake. """
+        for agent in grid.get_neighbors(pos, moore, include_center, radius):
+            if agent.unique_id in self._versions:
+                self.wake(agent, time)
+
+    def is_sleeping(self, agent: Agent) -> bool:
+        """ Returns True if the agent waits to be woken. """
+        return agent.unique_id in self._sleeping
+
+    def next_event_time(self) -> Optional[TimeT]:
+        """ Returns the time of the next activation, or None. """
+        self._drop_stale()
+        return self._queue[0][0] if self._queue else None
+
+    def step(self) -> None:
+        """ Execute the activations due before one unit of time from now. """
+        end = self.time + 1
+        self._step_end = end
+        try:
+            while True:
+                self._drop_stale()
+                if not self._queue or self._queue[0][0] >= end:
+                    break
+                time, _, _, key, version = heapq.heappop(self._queue)
+                self.time = time
+                del self._next_times[key]
+                if self.stats is None:
+                    self._agents[key].step()
+                else:
+                    agent = self._agents[key]
+                    start = perf_counter()
+                    agent.step()
+                    self.stats.record(self.steps, type(agent), perf_counter() - start)
+                if (
+                    self._versions.get(key) == version
+                    and self.reschedule_interval is not None
+                ):
+                    self.schedule(self._agents[key], time + self.reschedule_interval)
+                elif self._versions.get(key) == version:
+                    self.sleep(self._agents[key])
+        finally:
+            self._step_end = None
+        self.steps += 1
+        self.time = end
+
+    def _next_version(self) -> int:
+        self._sequence += 1
+        return self._sequence
+
+    def _default_time(self) -> TimeT:
+        return self.time if self._step_end is None else self._step_end
+
+    def _drop_stale(self) -> None:
+        """ Pop the invalidated entries off the top of the queue. """
+        queue = self._queue
+        versions = self._versions
+        while queue and versions.get(queue[0][3]) != queue[0][4]:
+            heapq.heappop(queue)
+
+    def _compact(self) -> None:
+        """ Rebuild the queue from its valid entries. """
+        versions = self._versions
+        self._queue = [
+            entry for entry in self._queue if versions.get(entry[3]) == entry[4]
+        ]
+        heapq.heapify(self._queue)
+
+
+class TiledActivation(BaseScheduler):
+    """A scheduler which activates agents tile by tile, following a
+    TileDecomposition of the grid.
+
+    Each step, agents are assigned to the tile holding their position at
+    the start of the step. Tiles are then processed one color at a time;
+    since tiles of the same color never share cells within the interaction
+    radius, the order of the tiles within a color does not matter, and the
+    result is the one a parallel update of those tiles would give. Agents
+    without a position are activated last.
+
+    Assumes that all agents have a step() method and a pos on the grid.
+
+    """
+
+    def __init__(self, model: Model, decomposition: Any, shuffled: bool = True) -> None:
+        """Create a new, empty TiledActivation scheduler.
+
+        Args:
+            model: The model the scheduler belongs to.
+            decomposition: The TileDecomposition of the model's grid.
+            shuffled: If True, agents within a tile are activated in random
+                      order, reshuffled every step.
+
+        """
+        super().__init__(model)
+        self.decomposition = decomposition
+        self.shuffled = shuffled
+
+    def step(self) -> None:
+        """ Execute the step of all agents, one tile color at a time. """
+        tiles: Dict[int, List[Agent]] = {}
+        unplaced = []
+        for agent in self.agent_buffer(shuffled=self.shuffled):
+            if agent.pos is None:
+                unplaced.append(agent)
+            else:
+                tile = self.decomposition.tile_of(agent.pos)
+                tiles.setdefault(tile.index, []).append(agent)
+
+        for color in self.decomposition.colors:
+            for tile in color:
+                self._step_agents(tiles.get(tile.index, ()))
+        self._step_agents(unplaced)
+
         self.steps += 1
         self.time += 1
+
+    def _step_agents(self, agents: Iterable[Agent]) -> None:
+        # Skip agents removed earlier in this step.
+        registry = self._agents
+        for agent in self._activations(
+            agent for agent in agents if agent.unique_id in registry
+        ):
+            agent.step()
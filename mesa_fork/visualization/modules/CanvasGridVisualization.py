@@ -92,14 +92,11 @@ class CanvasGrid(VisualizationElement):
 
     def render(self, model):
         grid_state = defaultdict(list)
-        for x in range(model.grid.width):
-            for y in range(model.grid.height):
-                cell_objects = model.grid.get_cell_list_contents([(x, y)])
-                for obj in cell_objects:
-                    portrayal = self.portrayal_method(obj)
-                    if portrayal:
-                        portrayal["x"] = x
-                        portrayal["y"] = y
-                        grid_state[portrayal["Layer"]].append(portrayal)
+        for obj, x, y in model.grid.iter_occupied_cells():
+            portrayal = self.portrayal_method(obj)
+            if portrayal:
+                portrayal["x"] = x
+                portrayal["y"] = y
+                grid_state[portrayal["Layer"]].append(portrayal)
 
         return grid_state
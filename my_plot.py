@@ -1,5 +1,8 @@
 from os import path
 
+import matplotlib.pyplot as plt
+import numpy as np
+
 def my_plot_export(fig,
                    axs,
                    name,
@@ -21,3 +24,23 @@ def my_plot_export(fig,
     fig.savefig(path.join(directory, name + '.pdf'),
                 format='pdf',
                 bbox_inches='tight')
+
+def upscale(data, factor=10):
+    # Every cell becomes a factor x factor block of pixels
+    return np.repeat(np.repeat(data, factor, axis=0), factor, axis=1)
+
+def my_image_export(data,
+                    name,
+                    factor=10,
+                    cmap=None,
+                    vmin=None,
+                    vmax=None,
+                    format='pdf',
+                    directory='plots'):
+
+    plt.imsave(path.join(directory, name + '.' + format),
+               upscale(data, factor),
+               cmap=cmap,
+               vmin=vmin,
+               vmax=vmax,
+               format=format)